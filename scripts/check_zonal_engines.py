@@ -0,0 +1,74 @@
+"""
+Script pour vérifier que les moteurs de statistiques zonales donnent les mêmes chiffres
+
+exactextract (s'il est installé) et le moteur par fenêtres sont comparés sur les
+gouvernorats, pour un raster donné ou un raster synthétique couvrant la Tunisie.
+
+Usage:
+    python scripts/check_zonal_engines.py [raster.tif ...]
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from analysis.spatial_stats import EXACTEXTRACT_AVAILABLE, SpatialStats
+
+SHAPEFILE = 'data/external/gadm41_TUN_1.shp'
+STATS = ['mean', 'sum', 'std', 'min', 'max', 'count']
+
+
+def synthetic_raster(path, bounds, resolution=0.01, nodata=-9999):
+    """
+    Écrit un raster aléatoire (float32, ~5% nodata) couvrant bounds (minx, miny, maxx, maxy)
+    """
+    width = int(np.ceil((bounds[2] - bounds[0]) / resolution))
+    height = int(np.ceil((bounds[3] - bounds[1]) / resolution))
+    rng = np.random.default_rng(0)
+    data = rng.gamma(2.0, 2.0, size=(height, width)).astype(np.float32)
+    data[rng.random((height, width)) < 0.05] = nodata
+
+    with rasterio.open(
+        path, 'w', driver='GTiff', height=height, width=width, count=1, dtype='float32',
+        crs='EPSG:4326', transform=from_origin(bounds[0], bounds[3], resolution, resolution),
+        nodata=nodata
+    ) as dst:
+        dst.write(data, 1)
+    return path
+
+
+if not EXACTEXTRACT_AVAILABLE:
+    print("ℹ️  exactextract non installé: un seul moteur, rien à comparer")
+    sys.exit(0)
+
+stats = SpatialStats(SHAPEFILE)
+raster_paths = sys.argv[1:]
+tmp_dir = None
+if not raster_paths:
+    tmp_dir = tempfile.TemporaryDirectory()
+    raster_paths = [synthetic_raster(os.path.join(tmp_dir.name, 'synthetic.tif'),
+                                     stats.governorates.total_bounds)]
+
+ok = True
+for raster_path in raster_paths:
+    print(f"\n📊 {os.path.basename(raster_path)}")
+    exact = stats._compute_zonal_stats_exact(raster_path, stats.governorates, STATS)
+    fused = stats._compute_zonal_stats_fused({'value': raster_path}, stats=STATS)['value']
+
+    for stat in STATS:
+        a, b = exact[stat].to_numpy(dtype=float), fused[stat].to_numpy(dtype=float)
+        same = np.allclose(a, b, rtol=1e-6, equal_nan=True)
+        ok &= same
+        diff = np.nanmax(np.abs(a - b)) if np.isfinite(a - b).any() else 0.0
+        print(f"  {'✓' if same else '✗'} {stat:5s} écart max: {diff:.6g}")
+
+if tmp_dir is not None:
+    tmp_dir.cleanup()
+
+sys.exit(0 if ok else 1)
@@ -3,8 +3,104 @@ Script pour extraire les données AQUASTAT et World Bank pour Tunisia
 """
 
 import pandas as pd
+import numpy as np
+import glob
+import hashlib
 import os
 
+try:
+    from charset_normalizer import from_bytes
+    CHARSET_NORMALIZER_AVAILABLE = True
+except ImportError:
+    CHARSET_NORMALIZER_AVAILABLE = False
+
+
+def detect_encoding(path, sample_size=65536):
+    """
+    Détecte l'encodage d'un fichier texte depuis un échantillon de ses premiers octets
+    """
+    with open(path, 'rb') as f:
+        sample = f.read(sample_size)
+    
+    if sample.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8-sig'
+    if sample.isascii():
+        # ASCII ⊂ UTF-8: reste valide si des octets non-ASCII suivent l'échantillon
+        return 'utf-8'
+    
+    if CHARSET_NORMALIZER_AVAILABLE:
+        best = from_bytes(sample).best()
+        if best is not None:
+            return best.encoding
+    
+    try:
+        sample.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+def _stable_repr(value):
+    """
+    Représentation stable entre exécutions (fonctions identifiées par leur code)
+    """
+    if hasattr(value, '__code__'):
+        code = value.__code__
+        return f"<code {code.co_code.hex()} {code.co_consts!r} {code.co_names!r}>"
+    if isinstance(value, dict):
+        return '{' + ', '.join(f"{k!r}: {_stable_repr(v)}" for k, v in sorted(value.items())) + '}'
+    if isinstance(value, (list, tuple, set)):
+        items = sorted(value, key=repr) if isinstance(value, set) else value
+        return '[' + ', '.join(_stable_repr(v) for v in items) + ']'
+    return repr(value)
+
+
+def read_csv_cached(path, **read_csv_kwargs):
+    """
+    Lit un CSV en réutilisant un cache pickle indexé par (chemin, mtime, taille, options)
+    
+    Args:
+        path: Chemin du CSV
+        **read_csv_kwargs: Options passées à pd.read_csv (usecols, dtype, ...)
+    
+    Returns:
+        (DataFrame, description de la source: encodage détecté ou 'cache')
+    """
+    stat = os.stat(path)
+    version = f"{stat.st_mtime_ns}.{stat.st_size}"
+    options = hashlib.sha1(_stable_repr(read_csv_kwargs).encode('utf-8')).hexdigest()[:12]
+    cache_file = f"{path}.{version}.{options}.pkl"
+    
+    if os.path.exists(cache_file):
+        try:
+            return pd.read_pickle(cache_file), 'cache'
+        except Exception:
+            # Cache tronqué ou écrit par une autre version de pandas: relire le CSV
+            os.remove(cache_file)
+    
+    encoding = detect_encoding(path)
+    df = pd.read_csv(path, encoding=encoding, **read_csv_kwargs)
+    
+    # Supprimer les caches d'anciennes versions du fichier (les autres options restent)
+    for cached in glob.glob(f"{glob.escape(path)}.*.pkl"):
+        if not os.path.basename(cached).startswith(f"{os.path.basename(path)}.{version}."):
+            os.remove(cached)
+    df.to_pickle(cache_file)
+    
+    return df, encoding
+
+
+# Colonnes AQUASTAT utiles (les deux conventions de nommage sont acceptées)
+# Year/Value typés au parsing; Value reste en float64 car V_a est multiplié par 1e9
+AQUASTAT_DTYPES = {
+    'Area': 'category', 'AREA': 'category',
+    'Year': 'int16', 'timePointYears': 'int16',
+    'Variable': 'category', 'aquastatElement': 'category',
+    'Unit': 'category',
+    'Value': 'float64'
+}
+
+
 # Créer répertoire de sortie
 os.makedirs('data/processed', exist_ok=True)
 
@@ -14,48 +110,56 @@ print("="*60)
 
 # 1. WORLD BANK - GVA_a (Agriculture Value Added)
 print("\n1️⃣ Extraction GVA_a (World Bank)...")
-df_wb = pd.read_csv('data/external/API_NV.AGR.TOTL.CD_DS2_en_csv_v2_110847.csv', skiprows=4)
-tunisia_wb = df_wb[df_wb['Country Name'] == 'Tunisia']
-
 years = ['2018', '2019', '2020', '2021', '2022', '2023']
-gva_data = []
 
-for year in years:
-    if year in tunisia_wb.columns:
-        value = tunisia_wb[year].values[0]
-        gva_data.append({
-            'year': int(year),
-            'GVA_a': value
-        })
-        print(f"  {year}: ${value:,.0f}")
+# Ne parser que le pays et les années utiles (le fichier contient ~65 colonnes d'années)
+df_wb = pd.read_csv(
+    'data/external/API_NV.AGR.TOTL.CD_DS2_en_csv_v2_110847.csv',
+    skiprows=4,
+    usecols=lambda col: col == 'Country Name' or col in years,
+    dtype={year: 'float64' for year in years},
+    index_col='Country Name'
+)
+
+present = [y for y in years if y in df_wb.columns]
+gva_vals = df_wb.loc['Tunisia', present].to_numpy(dtype=np.float64)
+
+df_gva = pd.DataFrame({'year': np.asarray(present, dtype=int), 'GVA_a': gva_vals})
 
-df_gva = pd.DataFrame(gva_data)
+for year, value in zip(present, gva_vals):
+    print(f"  {year}: ${value:,.0f}")
 
 # 2. AQUASTAT - V_a et autres variables
 print("\n2️⃣ Extraction données AQUASTAT...")
 
 try:
-    # Essayer différents encodages
-    for encoding in ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']:
-        try:
-            df_aqua = pd.read_csv('data/external/AQUASTAT Dissemination System (2).csv', 
-                                 encoding=encoding)
-            print(f"  ✓ Fichier chargé avec encoding: {encoding}")
-            break
-        except:
-            continue
+    # Détecter l'encodage sur un échantillon puis parser une seule fois
+    # (ou relire le cache si le CSV n'a pas changé)
+    aquastat_file = 'data/external/AQUASTAT Dissemination System (2).csv'
+    df_aqua, source = read_csv_cached(
+        aquastat_file,
+        usecols=lambda col: col in AQUASTAT_DTYPES,
+        dtype=AQUASTAT_DTYPES
+    )
+    if source == 'cache':
+        print("  ✓ Fichier chargé depuis le cache")
+    else:
+        print(f"  ✓ Fichier chargé avec encoding: {source}")
     
     # Afficher colonnes pour debug
     print(f"  📋 Colonnes: {df_aqua.columns.tolist()}")
     
-    # Filtrer Tunisia pour années 2017-2022 (disponibles dans AQUASTAT)
     area_col = 'Area' if 'Area' in df_aqua.columns else 'AREA'
     year_col = 'Year' if 'Year' in df_aqua.columns else 'timePointYears'
+    var_col = 'Variable' if 'Variable' in df_aqua.columns else 'aquastatElement'
+    unit_col = 'Unit'
+    val_col = 'Value'
     
-    tunisia_aqua = df_aqua[
-        (df_aqua[area_col] == 'Tunisia') & 
-        (df_aqua[year_col].astype(int).between(2017, 2022))
-    ]
+    # Filtrer Tunisia pour années 2017-2022 (disponibles dans AQUASTAT)
+    # Un seul masque booléen évalué une fois sur le fichier complet
+    years_int = df_aqua[year_col].to_numpy()
+    mask = (df_aqua[area_col] == 'Tunisia').to_numpy() & (years_int >= 2017) & (years_int <= 2022)
+    tunisia_aqua = df_aqua.loc[mask]
     
     print(f"  ✓ {len(tunisia_aqua)} lignes Tunisia (2017-2022)")
     
@@ -68,34 +172,32 @@ try:
         '% of agricultural GVA produced by irrigated agriculture'
     ]
     
+    # Recherche texte sur les catégories uniques uniquement (pas sur chaque ligne)
     print("\n  Variables disponibles:")
-    var_col = 'Variable' if 'Variable' in tunisia_aqua.columns else 'aquastatElement'
+    var_counts = tunisia_aqua[var_col].value_counts()
+    var_names_lower = var_counts.index.astype(str).str.lower()
     for var in key_variables:
-        data = tunisia_aqua[tunisia_aqua[var_col].astype(str).str.contains(var, case=False, na=False)]
-        if len(data) > 0:
-            print(f"    ✓ {var}: {len(data)} observations")
+        n_obs = int(var_counts[var_names_lower.str.contains(var.lower(), regex=False)].sum())
+        if n_obs > 0:
+            print(f"    ✓ {var}: {n_obs} observations")
         else:
             print(f"    ✗ {var}: Non trouvé")
     
-    # Déterminer le nom de la colonne Variable
-    var_col = 'Variable' if 'Variable' in tunisia_aqua.columns else 'aquastatElement'
+    # Partitionner une seule fois par (Variable, Unit)
+    grouped = tunisia_aqua.groupby([var_col, unit_col], observed=True)
+    
+    def get_group(key):
+        """Retourne le groupe (Variable, Unit) ou un DataFrame vide s'il est absent"""
+        if key in grouped.indices:
+            return tunisia_aqua.iloc[grouped.indices[key]]
+        return tunisia_aqua.iloc[0:0]
     
     # Extraire Agricultural water withdrawal (volume ABSOLU en 10^9 m³/year)
     # Filtrer par Variable ET Unit pour avoir les volumes, pas les pourcentages
-    unit_col = 'Unit' if 'Unit' in tunisia_aqua.columns else 'Unit'
-    v_a_data = tunisia_aqua[
-        (tunisia_aqua[var_col] == 'Agricultural water withdrawal') &
-        (tunisia_aqua[unit_col] == '10^9 m3/year')
-    ]
+    v_a_data = get_group(('Agricultural water withdrawal', '10^9 m3/year'))
     
     # Extraire % of agricultural GVA produced by irrigated agriculture
-    irrigated_gva_data = tunisia_aqua[
-        (tunisia_aqua[var_col] == '% of agricultural GVA produced by irrigated agriculture') &
-        (tunisia_aqua[unit_col] == '%')
-    ]
-    
-    # Extraire Agricultural Water Use Efficiency (USD/m³)
-    awue_data = tunisia_aqua[tunisia_aqua[var_col].astype(str).str.contains('Agricultural Water Use Efficiency', case=False, na=False)]
+    irrigated_gva_data = get_group(('% of agricultural GVA produced by irrigated agriculture', '%'))
     
     # Créer dictionnaires pour V_a et c_r
     v_a_dict = {}
@@ -104,27 +206,21 @@ try:
     # Extraire V_a
     if len(v_a_data) > 0:
         print("\n  📊 Agricultural water withdrawal (V_a):")
-        year_col = 'Year' if 'Year' in v_a_data.columns else 'timePointYears'
-        val_col = 'Value' if 'Value' in v_a_data.columns else 'Value'
-        
-        for _, row in v_a_data.iterrows():
-            year = int(row[year_col])
-            value = float(row[val_col]) * 1e9  # Convertir 10^9 m³ en m³
-            v_a_dict[year] = value
+        v_years = v_a_data[year_col].to_numpy()
+        v_vals = v_a_data[val_col].to_numpy() * 1e9  # Convertir 10^9 m³ en m³
+        v_a_dict = dict(zip(v_years.tolist(), v_vals.tolist()))
+        for year, value in zip(v_years.tolist(), v_vals.tolist()):
             print(f"    {year}: {value/1e9:.4f} x 10^9 m³ = {value:.2e} m³")
     
     # Extraire c_r depuis % irrigué
     if len(irrigated_gva_data) > 0:
         print("\n  🌾 % GVA irrigué → c_r (rainfed ratio):")
-        year_col = 'Year' if 'Year' in irrigated_gva_data.columns else 'timePointYears'
-        val_col = 'Value' if 'Value' in irrigated_gva_data.columns else 'Value'
-        
-        for _, row in irrigated_gva_data.iterrows():
-            year = int(row[year_col])
-            pct_irrigated = float(row[val_col])
-            c_r = 1 - (pct_irrigated / 100)  # c_r = rainfed ratio
-            c_r_dict[year] = c_r
-            print(f"    {year}: {pct_irrigated:.2f}% irrigué → c_r = {c_r:.4f} ({c_r*100:.2f}% rainfed)")
+        c_years = irrigated_gva_data[year_col].to_numpy()
+        pct_irrigated = irrigated_gva_data[val_col].to_numpy()
+        c_vals = 1.0 - pct_irrigated / 100.0  # c_r = rainfed ratio
+        c_r_dict = dict(zip(c_years.tolist(), c_vals.tolist()))
+        for year, pct, c_r in zip(c_years.tolist(), pct_irrigated.tolist(), c_vals.tolist()):
+            print(f"    {year}: {pct:.2f}% irrigué → c_r = {c_r:.4f} ({c_r*100:.2f}% rainfed)")
     
     # Si V_a et c_r trouvés, les utiliser; sinon estimation
     use_real_v_a = len(v_a_dict) > 0
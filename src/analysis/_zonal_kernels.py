@@ -0,0 +1,76 @@
+"""
+Noyaux compilés (Numba) pour l'accumulation des statistiques zonales.
+
+Si Numba n'est pas installé, NUMBA_AVAILABLE vaut False et SpatialStats
+utilise l'implémentation numpy (np.bincount).
+"""
+
+import numpy as np
+
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    # fastmath sans 'nnan'/'ninf': les tests NaN doivent rester valides
+    _FASTMATH = {'nsz', 'arcp', 'contract', 'afn', 'reassoc'}
+    
+    @numba.njit(parallel=True, fastmath=_FASTMATH, cache=True)
+    def accumulate_zonal(data, labels, nodata, sums, sumsq, counts, mins, maxs):
+        """
+        Accumule (en place) somme, somme des carrés, effectif, min et max par zone.
+        
+        Chaque thread traite une bande de lignes dans ses propres accumulateurs,
+        réduits en série à la fin (pas de contention entre threads).
+        
+        Args:
+            data: Bloc 2D de valeurs
+            labels: Bloc 2D d'identifiants de zone (0 = hors zones)
+            nodata: Valeur nodata à ignorer (les NaN sont aussi ignorés)
+            sums, sumsq, counts, mins, maxs: Accumulateurs de taille n_zones + 1
+        """
+        height, width = data.shape
+        if height == 0:
+            return
+        
+        n_bins = sums.shape[0]
+        n_chunks = min(numba.get_num_threads(), height)
+        rows_per_chunk = (height + n_chunks - 1) // n_chunks
+        
+        local_sums = np.zeros((n_chunks, n_bins))
+        local_sumsq = np.zeros((n_chunks, n_bins))
+        local_counts = np.zeros((n_chunks, n_bins), dtype=np.int64)
+        local_mins = np.full((n_chunks, n_bins), np.inf)
+        local_maxs = np.full((n_chunks, n_bins), -np.inf)
+        
+        for c in numba.prange(n_chunks):
+            start = c * rows_per_chunk
+            stop = min(start + rows_per_chunk, height)
+            for i in range(start, stop):
+                for j in range(width):
+                    zone = labels[i, j]
+                    if zone <= 0:
+                        continue
+                    v = data[i, j]
+                    if v == nodata or np.isnan(v):
+                        continue
+                    local_sums[c, zone] += v
+                    local_sumsq[c, zone] += v * v
+                    local_counts[c, zone] += 1
+                    if v < local_mins[c, zone]:
+                        local_mins[c, zone] = v
+                    if v > local_maxs[c, zone]:
+                        local_maxs[c, zone] = v
+        
+        for c in range(n_chunks):
+            for zone in range(n_bins):
+                sums[zone] += local_sums[c, zone]
+                sumsq[zone] += local_sumsq[c, zone]
+                counts[zone] += local_counts[c, zone]
+                if local_mins[c, zone] < mins[zone]:
+                    mins[zone] = local_mins[c, zone]
+                if local_maxs[c, zone] > maxs[zone]:
+                    maxs[zone] = local_maxs[c, zone]
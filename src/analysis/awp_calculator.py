@@ -25,7 +25,6 @@ from typing import Tuple, Dict, Optional
 import pandas as pd
 import numpy as np
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
@@ -47,7 +46,7 @@ class AWPCalculator:
             biomass_price: Prix de la biomasse (USD/kg), défaut: 0.05 USD/kg
         """
         self.biomass_price = biomass_price
-        logger.info(f"AWPCalculator initialisé (biomass_price={biomass_price} USD/kg)")
+        logger.info("AWPCalculator initialisé (biomass_price=%s USD/kg)", biomass_price)
     
     def calculate_a_we(
         self,
@@ -76,7 +75,7 @@ class AWPCalculator:
         
         a_we = (gva_a * (1 - c_r)) / v_a
         
-        logger.info(f"  A_we = {a_we:.4f} USD/m³")
+        logger.info("  A_we = %.4f USD/m³", a_we)
         return a_we
     
     def calculate_a_wp1(
@@ -106,7 +105,7 @@ class AWPCalculator:
         
         a_wp1 = (gva_a * (1 - c_r)) / v_etb
         
-        logger.info(f"  A_wp1 = {a_wp1:.4f} USD/m³")
+        logger.info("  A_wp1 = %.4f USD/m³", a_wp1)
         return a_wp1
     
     def calculate_a_wp2(
@@ -132,9 +131,39 @@ class AWPCalculator:
         
         a_wp2 = wpb_mean * price
         
-        logger.info(f"  A_wp2 = {a_wp2:.4f} USD/m³")
+        logger.info("  A_wp2 = %.4f USD/m³", a_wp2)
         return a_wp2
     
+    def calculate_awp_series(
+        self,
+        df: pd.DataFrame,
+        biomass_price: Optional[float] = None
+    ) -> pd.DataFrame:
+        """
+        Calcule A_we, A_wp1 et A_wp2 pour plusieurs années en une seule opération.
+        
+        Équivalent vectorisé de calculate_a_we / calculate_a_wp1 / calculate_a_wp2
+        (V_a ou V_ETb <= 0 donne NaN).
+        
+        Args:
+            df: DataFrame avec colonnes GVA_a, V_a, c_r, V_ETb, WPb_mean (une ligne par année)
+            biomass_price: Prix biomasse (USD/kg), utilise self.biomass_price si None
+            
+        Returns:
+            Copie de df avec colonnes A_we, A_wp1, A_wp2 (USD/m³)
+        """
+        price = biomass_price if biomass_price is not None else self.biomass_price
+        
+        gva_irrigated = df['GVA_a'] * (1 - df['c_r'])
+        result = df.assign(
+            A_we=gva_irrigated / df['V_a'].where(df['V_a'] > 0),
+            A_wp1=gva_irrigated / df['V_ETb'].where(df['V_ETb'] > 0),
+            A_wp2=df['WPb_mean'] * price
+        )
+        
+        logger.info("AWP calculé pour %d années (A_we, A_wp1, A_wp2)", len(result))
+        return result
+    
     def calculate_v_etb(
         self,
         etb_raster: np.ndarray,
@@ -156,17 +185,28 @@ class AWPCalculator:
         """
         logger.info("Calcul de V_ETb (volume total)")
         
+        # Travailler en float32 (pas de promotion float64 implicite sur le raster)
+        etb_raster = np.asarray(etb_raster, dtype=np.float32)
+        cropland_mask = np.asarray(cropland_mask)
+        if cropland_mask.dtype.kind == 'f':
+            cropland_mask = cropland_mask.astype(np.float32, copy=False)
+        
         # Créer un masque pour les valeurs valides (ETb >= 0, cropland > 0)
-        valid_mask = (etb_raster >= 0) & (cropland_mask > 0) & (~np.isnan(etb_raster)) & (~np.isnan(cropland_mask))
+        # Les comparaisons avec NaN valent False: pas besoin de np.isnan
+        valid_mask = (etb_raster >= 0) & (cropland_mask > 0)
         
-        # ETb en mm → m: diviser par 1000
-        etb_m = etb_raster / 1000.0
+        # ETb en mm → m (÷1000) et surface pixel factorisés en un seul scalaire
+        scale = pixel_area_m2 / 1000.0
         
         # Volume total (m³) - seulement sur pixels valides
-        v_etb = np.sum(etb_m[valid_mask] * pixel_area_m2 * cropland_mask[valid_mask])
-        
-        logger.info(f"  V_ETb = {v_etb:,.0f} m³")
-        logger.info(f"  Pixels valides: {np.sum(valid_mask):,}")
+        # Un seul produit float32 écrit hors des pixels invalides, accumulé en float64
+        weighted = np.zeros(np.shape(etb_raster), dtype=np.float32)
+        np.multiply(etb_raster, cropland_mask, out=weighted, where=valid_mask)
+        v_etb = float(weighted.sum(dtype=np.float64)) * scale
+        
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("  V_ETb = %s m³", f"{v_etb:,.0f}")
+            logger.info("  Pixels valides: %s", f"{np.count_nonzero(valid_mask):,}")
         return v_etb
     
     def calculate_all_awp(
@@ -196,9 +236,9 @@ class AWPCalculator:
         Returns:
             Dictionnaire avec A_we, A_wp1, A_wp2, V_ETb
         """
-        logger.info(f"\n{'='*60}")
-        logger.info(f"Calcul AWP - Année {year}")
-        logger.info(f"{'='*60}")
+        logger.info("\n%s", '=' * 60)
+        logger.info("Calcul AWP - Année %s", year)
+        logger.info("%s", '=' * 60)
         
         # Calculer V_ETb
         v_etb = self.calculate_v_etb(etb_raster, cropland_mask, pixel_area_m2)
@@ -220,12 +260,13 @@ class AWPCalculator:
             'WPb_mean': wpb_mean
         }
         
-        logger.info(f"\nRésultats {year}:")
-        logger.info(f"  A_we  = {a_we:.4f} USD/m³")
-        logger.info(f"  A_wp1 = {a_wp1:.4f} USD/m³")
-        logger.info(f"  A_wp2 = {a_wp2:.4f} USD/m³")
-        logger.info(f"  V_a   = {v_a:,.0f} m³")
-        logger.info(f"  V_ETb = {v_etb:,.0f} m³")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("\nRésultats %s:", year)
+            logger.info("  A_we  = %.4f USD/m³", a_we)
+            logger.info("  A_wp1 = %.4f USD/m³", a_wp1)
+            logger.info("  A_wp2 = %.4f USD/m³", a_wp2)
+            logger.info("  V_a   = %s m³", f"{v_a:,.0f}")
+            logger.info("  V_ETb = %s m³", f"{v_etb:,.0f}")
         
         return results
     
@@ -234,23 +275,28 @@ class AWPCalculator:
         Compare les trois méthodes AWP sur plusieurs années.
         
         Args:
-            results_list: Liste de dictionnaires de résultats
+            results_list: Liste de dictionnaires de résultats, ou DataFrame
+                          (ex: sortie de calculate_awp_series)
             
         Returns:
             DataFrame avec comparaison
         """
-        df = pd.DataFrame(results_list)
+        if isinstance(results_list, pd.DataFrame):
+            df = results_list.copy()
+        else:
+            df = pd.DataFrame(results_list)
         
         # Calculer les différences relatives
-        df['diff_wp1_we'] = ((df['A_wp1'] - df['A_we']) / df['A_we']) * 100
-        df['diff_wp2_we'] = ((df['A_wp2'] - df['A_we']) / df['A_we']) * 100
-        
-        logger.info("\n" + "="*60)
-        logger.info("Comparaison des méthodes AWP")
-        logger.info("="*60)
-        logger.info(f"\nMoyenne période {df['year'].min()}-{df['year'].max()}:")
-        logger.info(f"  A_we  = {df['A_we'].mean():.4f} USD/m³")
-        logger.info(f"  A_wp1 = {df['A_wp1'].mean():.4f} USD/m³ ({df['diff_wp1_we'].mean():+.1f}%)")
-        logger.info(f"  A_wp2 = {df['A_wp2'].mean():.4f} USD/m³ ({df['diff_wp2_we'].mean():+.1f}%)")
+        df['diff_wp1_we'] = (df['A_wp1'] / df['A_we'] - 1) * 100
+        df['diff_wp2_we'] = (df['A_wp2'] / df['A_we'] - 1) * 100
+        
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("\n%s", "=" * 60)
+            logger.info("Comparaison des méthodes AWP")
+            logger.info("%s", "=" * 60)
+            logger.info("\nMoyenne période %s-%s:", df['year'].min(), df['year'].max())
+            logger.info("  A_we  = %.4f USD/m³", df['A_we'].mean())
+            logger.info("  A_wp1 = %.4f USD/m³ (%+.1f%%)", df['A_wp1'].mean(), df['diff_wp1_we'].mean())
+            logger.info("  A_wp2 = %.4f USD/m³ (%+.1f%%)", df['A_wp2'].mean(), df['diff_wp2_we'].mean())
         
         return df
@@ -17,10 +17,48 @@ import numpy as np
 import rasterio
 from rasterio.warp import reproject, Resampling
 
-logging.basicConfig(level=logging.INFO)
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 
+if NUMBA_AVAILABLE:
+    # fastmath sans 'nnan'/'ninf': les tests NaN doivent rester valides
+    _FASTMATH = {'nsz', 'arcp', 'contract', 'afn', 'reassoc'}
+    
+    @numba.njit(parallel=True, fastmath=_FASTMATH, cache=True)
+    def _etb_kernel(aeti, pcp, peff_factor, out):
+        """ETb = max(AETI - peff_factor * PCP, 0) en une passe, NaN si AETI/PCP invalide."""
+        height, width = aeti.shape
+        for i in numba.prange(height):
+            for j in range(width):
+                a = aeti[i, j]
+                p = pcp[i, j]
+                # Les comparaisons avec NaN valent False
+                if a >= 0 and p >= 0:
+                    v = a - peff_factor * p
+                    out[i, j] = v if v > 0 else 0
+                else:
+                    out[i, j] = np.nan
+    
+    @numba.njit(parallel=True, fastmath=_FASTMATH, cache=True)
+    def _wpb_kernel(tbp, etb, out):
+        """WPb = TBP / (10 * ETb) en une passe, NaN si ETb <= 0 ou TBP invalide."""
+        height, width = tbp.shape
+        for i in numba.prange(height):
+            for j in range(width):
+                t = tbp[i, j]
+                e = etb[i, j]
+                if e > 0 and t >= 0:
+                    out[i, j] = t / (10 * e)
+                else:
+                    out[i, j] = np.nan
+
+
 class ETbCalculator:
     """
     Classe pour calculer ETb selon la méthodologie SDG 6.4.1.
@@ -39,7 +77,7 @@ class ETbCalculator:
                         P_effective ≈ 0.7 * P_annual (approximation)
         """
         self.peff_factor = peff_factor
-        logger.info(f"ETbCalculator initialisé (P_eff factor={peff_factor})")
+        logger.info("ETbCalculator initialisé (P_eff factor=%s)", peff_factor)
     
     def calculate_effective_precipitation(self, pcp_monthly: np.ndarray) -> np.ndarray:
         """
@@ -56,17 +94,15 @@ class ETbCalculator:
             Précipitations effectives (mm/mois)
         """
         pcp_monthly = np.asarray(pcp_monthly, dtype=np.float32)
-        pcp_effective = np.zeros_like(pcp_monthly)
         
-        # Cas 1: P > 75 mm
+        # Coefficients par pixel (cas P > 75 mm vs P <= 75 mm), sans indexation booléenne
         mask_high = pcp_monthly > 75
-        pcp_effective[mask_high] = np.maximum(0.8 * pcp_monthly[mask_high] - 25, 0)
+        slope = np.where(mask_high, np.float32(0.8), np.float32(0.6))
+        offset = np.where(mask_high, np.float32(25), np.float32(10))
         
-        # Cas 2: P <= 75 mm
-        mask_low = ~mask_high
-        pcp_effective[mask_low] = np.maximum(0.6 * pcp_monthly[mask_low] - 10, 0)
-        
-        return pcp_effective
+        pcp_effective = slope * pcp_monthly
+        pcp_effective -= offset
+        return np.maximum(pcp_effective, 0, out=pcp_effective)
     
     def align_raster(
         self,
@@ -76,7 +112,8 @@ class ETbCalculator:
         reference_shape: tuple,
         reference_transform,
         reference_crs,
-        resampling_method=Resampling.bilinear
+        resampling_method=Resampling.bilinear,
+        num_threads: Optional[int] = None
     ) -> np.ndarray:
         """
         Aligner un raster à une grille de référence.
@@ -89,24 +126,172 @@ class ETbCalculator:
             reference_transform: Transformation de référence
             reference_crs: CRS de référence
             resampling_method: Méthode de rééchantillonnage
+            num_threads: Threads du warper GDAL (défaut: tous les CPU)
             
         Returns:
-            Données alignées
+            Données alignées (NaN hors de l'emprise source)
         """
-        aligned_data = np.zeros(reference_shape, dtype=np.float32)
+        # Même grille: la reprojection serait une identité
+        if (
+            source_data.shape == tuple(reference_shape)
+            and source_transform == reference_transform
+            and source_crs == reference_crs
+        ):
+            return np.asarray(source_data, dtype=np.float32)
+        
+        # Pas de pré-remplissage: le warper initialise lui-même la destination à nodata
+        aligned_data = np.empty(reference_shape, dtype=np.float32)
         
         reproject(
             source=source_data,
             destination=aligned_data,
             src_transform=source_transform,
             src_crs=source_crs,
+            src_nodata=np.nan,
             dst_transform=reference_transform,
             dst_crs=reference_crs,
-            resampling=resampling_method
+            dst_nodata=np.nan,
+            resampling=resampling_method,
+            num_threads=num_threads or os.cpu_count() or 1,
+            warp_mem_limit=512
         )
         
         return aligned_data
     
+    def _read_band(self, src, window=None) -> np.ndarray:
+        """
+        Lit la bande 1 en float32, nodata → NaN, et applique scale/offset s'ils existent.
+        
+        Les fichiers téléchargés sont déjà en unités physiques (scale = 1); la
+        conversion couvre les rasters WaPOR natifs lus directement.
+        
+        Args:
+            src: Dataset rasterio ouvert
+            window: Fenêtre à lire (défaut: raster entier)
+            
+        Returns:
+            Bande en unités physiques (float32, NaN sur les pixels nodata)
+        """
+        data = src.read(1, window=window, out_dtype=np.float32)
+        # Masque GDAL: couvre les nodata positifs, NaN et les masques internes
+        data[src.read_masks(1, window=window) == 0] = np.nan
+        
+        scale, offset = src.scales[0], src.offsets[0]
+        if scale != 1 or offset != 0:
+            data *= np.float32(scale)
+            data += np.float32(offset)
+        return data
+    
+    def _etb_block(
+        self,
+        aeti: np.ndarray,
+        pcp: np.ndarray,
+        use_annual_approximation: bool = True
+    ) -> np.ndarray:
+        """
+        Calcule ETb sur un bloc de pixels (AETI et PCP déjà alignés).
+        
+        Args:
+            aeti: Bloc AETI (mm/an)
+            pcp: Bloc PCP (mm/an)
+            use_annual_approximation: Utiliser approximation annuelle (P_eff ≈ 0.7 * P)
+            
+        Returns:
+            ETb (mm/an), NaN hors des pixels valides (AETI >= 0 et PCP >= 0)
+        """
+        if NUMBA_AVAILABLE and use_annual_approximation:
+            etb = np.empty(aeti.shape, dtype=np.float32)
+            _etb_kernel(aeti, pcp, np.float32(self.peff_factor), etb)
+            return etb
+        
+        # Les nodata négatifs et NaN sont exclus
+        valid = (aeti >= 0) & (pcp >= 0)
+        
+        # Calculer P_effective
+        if use_annual_approximation:
+            pcp_effective = np.multiply(pcp, np.float32(self.peff_factor))
+        else:
+            # Utiliser la formule de Brouwer & Heibloem (nécessite données mensuelles)
+            pcp_effective = self.calculate_effective_precipitation(pcp)
+        
+        # ETb = max(AETI - P_effective, 0) sur les pixels valides, NaN ailleurs
+        etb = np.full(aeti.shape, np.nan, dtype=np.float32)
+        np.subtract(aeti, pcp_effective, out=etb, where=valid)
+        np.maximum(etb, 0, out=etb, where=valid)
+        return etb
+    
+    def _wpb_block(self, tbp: np.ndarray, etb: np.ndarray) -> np.ndarray:
+        """
+        Calcule WPb sur un bloc de pixels (TBP et ETb déjà alignés).
+        
+        Args:
+            tbp: Bloc TBP (kg/ha)
+            etb: Bloc ETb (mm/an)
+            
+        Returns:
+            WPb (kg/m³), NaN si ETb <= 0 ou TBP invalide
+        """
+        if NUMBA_AVAILABLE:
+            wpb = np.empty(tbp.shape, dtype=np.float32)
+            _wpb_kernel(tbp, etb, wpb)
+            return wpb
+        
+        valid = (etb > 0) & (tbp >= 0)
+        
+        # Calculer WPb = TBP / (10 * ETb) (kg/m³), 1 mm/an = 10 m³/ha
+        # Inverse de ETb calculé une fois, la conversion m³/ha incluse dans le numérateur
+        wpb = np.full(tbp.shape, np.nan, dtype=np.float32)
+        np.divide(np.float32(0.1), etb, out=wpb, where=valid)
+        np.multiply(wpb, tbp, out=wpb, where=valid)
+        return wpb
+    
+    def _prepare_mask(self, cropland_mask: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """
+        Évite la promotion implicite en float64 lors de l'application du masque.
+        
+        Les masques binaires (bool, entiers) sont conservés tels quels; les
+        fractions flottantes sont converties en float32.
+        """
+        if cropland_mask is None:
+            return None
+        cropland_mask = np.asarray(cropland_mask)
+        if cropland_mask.dtype.kind == 'f':
+            return cropland_mask.astype(np.float32, copy=False)
+        return cropland_mask
+    
+    def _summary_stats(self, data: np.ndarray, prefix: str) -> Dict:
+        """
+        Calcule min, max, mean, median et std en ignorant les NaN.
+        
+        Les pixels valides sont extraits une seule fois; moyenne et écart-type
+        sont dérivés de (n, somme, somme des carrés) accumulés en float64.
+        
+        Args:
+            data: Raster (NaN = pixel invalide)
+            prefix: Préfixe des clés (etb, wpb, ...)
+            
+        Returns:
+            Dictionnaire {prefix_min, prefix_max, prefix_mean, prefix_median, prefix_std}
+        """
+        values = data[~np.isnan(data)]
+        n = values.size
+        
+        if n == 0:
+            return {f'{prefix}_{key}': np.nan for key in ('min', 'max', 'mean', 'median', 'std')}
+        
+        total = float(values.sum(dtype=np.float64))
+        total_sq = float(np.einsum('i,i->', values, values, dtype=np.float64))
+        mean = total / n
+        variance = max(total_sq / n - mean * mean, 0.0)
+        
+        return {
+            f'{prefix}_min': float(values.min()),
+            f'{prefix}_max': float(values.max()),
+            f'{prefix}_mean': mean,
+            f'{prefix}_median': float(np.median(values)),
+            f'{prefix}_std': float(np.sqrt(variance))
+        }
+    
     def calculate_etb(
         self,
         aeti_file: str,
@@ -128,66 +313,74 @@ class ETbCalculator:
         Returns:
             (etb_annual, etb_cropland, statistics)
         """
-        logger.info(f"Calcul de ETb")
-        logger.info(f"  AETI: {os.path.basename(aeti_file)}")
-        logger.info(f"  PCP:  {os.path.basename(pcp_file)}")
-        
-        # Charger AETI (référence spatiale)
-        with rasterio.open(aeti_file) as src:
-            aeti_annual = src.read(1).astype(np.float32)
-            aeti_annual[aeti_annual < 0] = np.nan
-            aeti_profile = src.profile
-            aeti_transform = src.transform
-            aeti_crs = src.crs
-            reference_shape = aeti_annual.shape
-        
-        # Charger PCP
-        with rasterio.open(pcp_file) as src:
-            pcp_raw = src.read(1).astype(np.float32)
-            pcp_raw[pcp_raw < 0] = np.nan
-            pcp_transform = src.transform
-            pcp_crs = src.crs
-        
-        # Aligner PCP si nécessaire
-        if pcp_raw.shape != reference_shape:
-            logger.info(f"  Rééchantillonnage PCP: {pcp_raw.shape} → {reference_shape}")
-            pcp_annual = self.align_raster(
-                pcp_raw, pcp_transform, pcp_crs,
-                reference_shape, aeti_transform, aeti_crs,
-                resampling_method=Resampling.bilinear
-            )
-        else:
-            pcp_annual = pcp_raw
+        logger.info("Calcul de ETb")
+        logger.info("  AETI: %s", os.path.basename(aeti_file))
+        logger.info("  PCP:  %s", os.path.basename(pcp_file))
         
-        # Calculer P_effective
         if use_annual_approximation:
-            pcp_effective = self.peff_factor * pcp_annual
-            logger.info(f"  P_effective ≈ {self.peff_factor} * P_annual")
-        else:
-            # Utiliser la formule de Brouwer & Heibloem (nécessite données mensuelles)
-            pcp_effective = self.calculate_effective_precipitation(pcp_annual)
+            logger.info("  P_effective ≈ %s * P_annual", self.peff_factor)
+        
+        aeti_sum = pcp_sum = 0.0
+        aeti_count = pcp_count = 0
         
-        # Calculer ETb
-        etb_annual = np.maximum(aeti_annual - pcp_effective, 0)
+        with rasterio.open(aeti_file) as aeti_src, rasterio.open(pcp_file) as pcp_src:
+            # AETI = référence spatiale
+            reference_shape = aeti_src.shape
+            etb_annual = np.empty(reference_shape, dtype=np.float32)
+            
+            same_grid = (
+                pcp_src.shape == reference_shape
+                and pcp_src.transform == aeti_src.transform
+                and pcp_src.crs == aeti_src.crs
+            )
+            
+            if same_grid:
+                # Même grille: traitement bloc par bloc, mémoire de travail O(bloc)
+                blocks = (
+                    (
+                        window.toslices(),
+                        self._read_band(aeti_src, window),
+                        self._read_band(pcp_src, window)
+                    )
+                    for _, window in aeti_src.block_windows(1)
+                )
+            else:
+                # Grilles différentes: aligner PCP en entier sur AETI
+                pcp_raw = self._read_band(pcp_src)
+                logger.info("  Rééchantillonnage PCP: %s → %s", pcp_raw.shape, reference_shape)
+                # Le rééchantillonnage bilinéaire ne doit pas mélanger les nodata négatifs
+                pcp_raw[pcp_raw < 0] = np.nan
+                pcp_annual = self.align_raster(
+                    pcp_raw, pcp_src.transform, pcp_src.crs,
+                    reference_shape, aeti_src.transform, aeti_src.crs,
+                    resampling_method=Resampling.bilinear
+                )
+                blocks = [(np.s_[:, :], self._read_band(aeti_src), pcp_annual)]
+            
+            for slices, aeti, pcp in blocks:
+                etb_annual[slices] = self._etb_block(aeti, pcp, use_annual_approximation)
+                
+                aeti_valid = aeti >= 0
+                aeti_sum += float(aeti.sum(where=aeti_valid, dtype=np.float64))
+                aeti_count += int(np.count_nonzero(aeti_valid))
+                pcp_valid = pcp >= 0
+                pcp_sum += float(pcp.sum(where=pcp_valid, dtype=np.float64))
+                pcp_count += int(np.count_nonzero(pcp_valid))
         
-        # Appliquer masque cropland
-        etb_cropland = etb_annual.copy()
-        if cropland_mask is not None:
-            etb_cropland = etb_annual * cropland_mask
-            etb_cropland[cropland_mask == 0] = np.nan
+        # Appliquer masque cropland (NaN hors cropland, sans seconde passe)
+        cropland_mask = self._prepare_mask(cropland_mask)
+        if cropland_mask is None:
+            etb_cropland = etb_annual.copy()
+        else:
+            etb_cropland = np.full_like(etb_annual, np.nan)
+            np.multiply(etb_annual, cropland_mask, out=etb_cropland, where=cropland_mask != 0)
         
         # Statistiques
-        stats = {
-            'etb_min': float(np.nanmin(etb_cropland)),
-            'etb_max': float(np.nanmax(etb_cropland)),
-            'etb_mean': float(np.nanmean(etb_cropland)),
-            'etb_median': float(np.nanmedian(etb_cropland)),
-            'etb_std': float(np.nanstd(etb_cropland)),
-            'aeti_mean': float(np.nanmean(aeti_annual)),
-            'pcp_mean': float(np.nanmean(pcp_annual))
-        }
+        stats = self._summary_stats(etb_cropland, 'etb')
+        stats['aeti_mean'] = aeti_sum / aeti_count if aeti_count else np.nan
+        stats['pcp_mean'] = pcp_sum / pcp_count if pcp_count else np.nan
         
-        logger.info(f"  ETb moyen: {stats['etb_mean']:.1f} mm/an")
+        logger.info("  ETb moyen: %.1f mm/an", stats['etb_mean'])
         
         return etb_annual, etb_cropland, stats
     
@@ -212,55 +405,63 @@ class ETbCalculator:
         Returns:
             (wpb_annual, wpb_cropland, statistics)
         """
-        logger.info(f"Calcul de WPb")
-        logger.info(f"  TBP: {os.path.basename(tbp_file)}")
+        logger.info("Calcul de WPb")
+        logger.info("  TBP: %s", os.path.basename(tbp_file))
         
         if not os.path.exists(tbp_file):
-            logger.warning(f"  Fichier TBP introuvable: {tbp_file}")
+            logger.warning("  Fichier TBP introuvable: %s", tbp_file)
             return None, None, None
         
-        # Charger TBP
+        tbp_sum = 0.0
+        tbp_count = 0
+        
         with rasterio.open(tbp_file) as src:
-            tbp_raw = src.read(1).astype(np.float32)
-            tbp_raw[tbp_raw < 0] = np.nan
-            tbp_transform = src.transform
-            tbp_crs = src.crs
-        
-        # Aligner TBP si nécessaire
-        reference_shape = etb_annual.shape
-        if tbp_raw.shape != reference_shape:
-            logger.info(f"  Rééchantillonnage TBP: {tbp_raw.shape} → {reference_shape}")
-            tbp_annual = self.align_raster(
-                tbp_raw, tbp_transform, tbp_crs,
-                reference_shape, etb_profile['transform'], etb_profile['crs'],
-                resampling_method=Resampling.bilinear
+            reference_shape = etb_annual.shape
+            wpb_annual = np.empty(reference_shape, dtype=np.float32)
+            
+            same_grid = (
+                src.shape == reference_shape
+                and src.transform == etb_profile['transform']
+                and src.crs == etb_profile['crs']
             )
-        else:
-            tbp_annual = tbp_raw
-        
-        # Convertir ETb de mm/an en m³/ha
-        # 1 mm/an = 10 m³/ha
-        etb_m3_ha = etb_annual * 10
-        
-        # Calculer WPb = TBP / ETb (kg/m³)
-        wpb_annual = np.where(etb_m3_ha > 0, tbp_annual / etb_m3_ha, np.nan)
+            
+            if same_grid:
+                # Même grille: traitement bloc par bloc, mémoire de travail O(bloc)
+                blocks = (
+                    (window.toslices(), self._read_band(src, window))
+                    for _, window in src.block_windows(1)
+                )
+            else:
+                # Grilles différentes: aligner TBP en entier sur ETb
+                tbp_raw = self._read_band(src)
+                logger.info("  Rééchantillonnage TBP: %s → %s", tbp_raw.shape, reference_shape)
+                tbp_raw[tbp_raw < 0] = np.nan
+                tbp_annual = self.align_raster(
+                    tbp_raw, src.transform, src.crs,
+                    reference_shape, etb_profile['transform'], etb_profile['crs'],
+                    resampling_method=Resampling.bilinear
+                )
+                blocks = [(np.s_[:, :], tbp_annual)]
+            
+            for slices, tbp in blocks:
+                wpb_annual[slices] = self._wpb_block(tbp, etb_annual[slices])
+                
+                tbp_valid = tbp >= 0
+                tbp_sum += float(tbp.sum(where=tbp_valid, dtype=np.float64))
+                tbp_count += int(np.count_nonzero(tbp_valid))
         
-        # Appliquer masque cropland
-        wpb_cropland = wpb_annual.copy()
-        if cropland_mask is not None:
-            wpb_cropland = wpb_annual * cropland_mask
-            wpb_cropland[cropland_mask == 0] = np.nan
+        # Appliquer masque cropland (inutile si le masque couvre tous les pixels)
+        cropland_mask = self._prepare_mask(cropland_mask)
+        if cropland_mask is None or np.all(cropland_mask == 1):
+            wpb_cropland = wpb_annual.copy()
+        else:
+            wpb_cropland = np.full_like(wpb_annual, np.nan)
+            np.multiply(wpb_annual, cropland_mask, out=wpb_cropland, where=cropland_mask != 0)
         
         # Statistiques
-        stats = {
-            'wpb_min': float(np.nanmin(wpb_cropland)),
-            'wpb_max': float(np.nanmax(wpb_cropland)),
-            'wpb_mean': float(np.nanmean(wpb_cropland)),
-            'wpb_median': float(np.nanmedian(wpb_cropland)),
-            'wpb_std': float(np.nanstd(wpb_cropland)),
-            'tbp_mean': float(np.nanmean(tbp_annual))
-        }
+        stats = self._summary_stats(wpb_cropland, 'wpb')
+        stats['tbp_mean'] = tbp_sum / tbp_count if tbp_count else np.nan
         
-        logger.info(f"  WPb moyen: {stats['wpb_mean']:.2f} kg/m³")
+        logger.info("  WPb moyen: %.2f kg/m³", stats['wpb_mean'])
         
         return wpb_annual, wpb_cropland, stats
@@ -3,6 +3,9 @@ Module pour les analyses statistiques spatiales.
 """
 
 import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Optional, Union
 from pathlib import Path
 
@@ -11,17 +14,68 @@ import pandas as pd
 import xarray as xr
 import geopandas as gpd
 import rasterio
+import shapely
+from rasterio.features import rasterize
 from rasterio.mask import mask
+from rasterio.windows import Window
 from rasterstats import zonal_stats
-from shapely.geometry import mapping
+from shapely.geometry import box, mapping
+
+from ._zonal_kernels import NUMBA_AVAILABLE
+
+if NUMBA_AVAILABLE:
+    from ._zonal_kernels import accumulate_zonal
+
+try:
+    from exactextract import exact_extract
+    from exactextract.raster import RasterioRasterSource
+    EXACTEXTRACT_AVAILABLE = True
+except ImportError:
+    EXACTEXTRACT_AVAILABLE = False
+
+if EXACTEXTRACT_AVAILABLE:
+    class _NodataRasterioSource(RasterioRasterSource):
+        """Source exactextract avec nodata par défaut pour les rasters non étiquetés."""
+        
+        def __init__(self, ds, nodata, band_idx=1):
+            super().__init__(ds, band_idx)
+            self._default_nodata = nodata
+        
+        def nodata_value(self):
+            nodata = super().nodata_value()
+            if nodata is None and not self.scaled:
+                return self._default_nodata if self.isfloat else int(self._default_nodata)
+            return nodata
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# SpatialStats propre à chaque processus de aggregate_many (zones parsées une fois)
+_worker_stats = None
+
+
+def _init_aggregate_worker(zones_wkb: pd.DataFrame, crs) -> None:
+    """Initialise un processus worker: reconstruit les gouvernorats depuis le WKB."""
+    global _worker_stats
+    zones = zones_wkb.copy()
+    zones['geometry'] = gpd.GeoSeries.from_wkb(zones['geometry'])
+    _worker_stats = SpatialStats()
+    _worker_stats.governorates = gpd.GeoDataFrame(zones, geometry='geometry', crs=crs)
+
+
+def _aggregate_worker(raster_path: str, variable_name: str):
+    """Agrège un raster par gouvernorat dans un processus worker."""
+    return variable_name, _worker_stats.aggregate_by_governorate(raster_path, variable_name)
+
 
 class SpatialStats:
     """Classe pour les statistiques spatiales sur les gouvernorats tunisiens."""
     
+    # Statistiques calculées par _zonal_stats (exactextract ou moteur par fenêtres)
+    ZONAL_STATS = ('mean', 'sum', 'std', 'min', 'max', 'count')
+    
+    # Taille maximale du cache des blocs de zones rastérisés (octets)
+    LABEL_CACHE_MAX_BYTES = 256 * 1024 * 1024
+    
     def __init__(self, shapefile_path: Optional[str] = None):
         """
         Initialise le calculateur de statistiques spatiales.
@@ -31,32 +85,67 @@ class SpatialStats:
         """
         self.shapefile_path = shapefile_path
         self.governorates = None
+        # Blocs de zones rastérisés des gouvernorats, par (grille du raster, fenêtre),
+        # du moins au plus récemment utilisé
+        self._label_cache = OrderedDict()
+        self._label_cache_bytes = 0
         
         if shapefile_path:
             self.load_governorates(shapefile_path)
         
         logger.info("SpatialStats initialisé")
     
-    def load_governorates(self, shapefile_path: str) -> gpd.GeoDataFrame:
+    def load_governorates(
+        self,
+        shapefile_path: str,
+        target_crs: Optional[str] = None
+    ) -> gpd.GeoDataFrame:
         """
         Charge le shapefile des gouvernorats tunisiens.
         
+        L'index spatial (R-tree) est construit au chargement, une seule fois,
+        pour les requêtes spatiales ultérieures.
+        
         Args:
             shapefile_path: Chemin vers gadm41_TUN_1.shp
+            target_crs: CRS des rasters analysés (reprojection unique au chargement)
             
         Returns:
             GeoDataFrame des gouvernorats
         """
-        logger.info(f"Chargement shapefile: {shapefile_path}")
+        logger.info("Chargement shapefile: %s", shapefile_path)
         self.governorates = gpd.read_file(shapefile_path)
+        self._label_cache.clear()
+        self._label_cache_bytes = 0
+        
+        if target_crs is not None and self.governorates.crs != target_crs:
+            self.governorates = self.governorates.to_crs(target_crs)
         
         # Standardiser les noms de colonnes
         if 'NAME_1' in self.governorates.columns:
             self.governorates['governorate'] = self.governorates['NAME_1']
         
-        logger.info(f"✓ {len(self.governorates)} gouvernorats chargés")
+        # Construire l'index spatial maintenant plutôt qu'à la première requête
+        _ = self.governorates.sindex
+        
+        logger.info("✓ %s gouvernorats chargés", len(self.governorates))
         return self.governorates
     
+    def zones_intersecting(self, geometry) -> np.ndarray:
+        """
+        Indices (positionnels) des gouvernorats intersectant une géométrie.
+        
+        Args:
+            geometry: Géométrie shapely, dans le CRS des gouvernorats
+            
+        Returns:
+            Tableau des indices des gouvernorats concernés
+        """
+        if self.governorates is None:
+            raise ValueError("Shapefile des gouvernorats non chargé. Utilisez load_governorates()")
+        
+        return self.governorates.sindex.query(geometry, predicate='intersects')
+    
     def load_irrigation_areas(self, csv_path: str) -> pd.DataFrame:
         """
         Charge les surfaces irriguées par gouvernorat depuis TUN-gmia.
@@ -67,15 +156,17 @@ class SpatialStats:
         Returns:
             DataFrame avec governorate et area_irrigated_ha
         """
-        logger.info(f"Chargement surfaces irriguées: {csv_path}")
-        
-        # Lire le CSV
-        df = pd.read_csv(csv_path, nrows=23)  # 23 gouvernorats
-        df = df[['Governorate', 'Area equipped for irrigation (ha)']].copy()
-        
-        # Nettoyer les données
+        logger.info("Chargement surfaces irriguées: %s", csv_path)
+        
+        # Lire le CSV (séparateur de milliers ' ' interprété par le parseur C)
+        df = pd.read_csv(
+            csv_path,
+            nrows=23,  # 23 gouvernorats
+            thousands=' ',
+            usecols=['Governorate', 'Area equipped for irrigation (ha)'],
+            dtype={'Area equipped for irrigation (ha)': 'float32'}
+        )
         df.columns = ['governorate', 'area_irrigated_ha']
-        df['area_irrigated_ha'] = df['area_irrigated_ha'].str.replace(' ', '').astype(float)
         
         # Standardiser les noms pour correspondre à GADM
         name_mapping = {
@@ -88,9 +179,9 @@ class SpatialStats:
             'Sidi Bu Said': 'Sidi Bouzid',
             'Susa': 'Sousse',
         }
-        df['governorate'] = df['governorate'].replace(name_mapping)
+        df['governorate'] = df['governorate'].map(name_mapping).fillna(df['governorate'])
         
-        logger.info(f"✓ {len(df)} gouvernorats avec surfaces irriguées")
+        logger.info("✓ %s gouvernorats avec surfaces irriguées", len(df))
         return df
     
     def zonal_statistics_raster(
@@ -115,19 +206,35 @@ class SpatialStats:
         if stats is None:
             stats = ['mean', 'sum', 'std', 'min', 'max', 'count']
         
-        logger.info(f"Calcul statistiques zonales: {Path(raster_path).name}")
+        supported = not categorical and set(stats) <= set(self.ZONAL_STATS)
         
-        # Calculer statistiques avec rasterstats
-        results = zonal_stats(
-            zones,
-            raster_path,
-            stats=stats,
-            categorical=categorical,
-            nodata=-9999
-        )
-        
-        # Convertir en DataFrame
-        df_stats = pd.DataFrame(results)
+        if supported:
+            # Même moteur que calculate_awp_by_governorate (chiffres cohérents)
+            df_stats = self._zonal_stats({'value': raster_path}, zones=zones, stats=stats)['value']
+        else:
+            logger.info("Calcul statistiques zonales: %s", Path(raster_path).name)
+            
+            # Calculer statistiques avec rasterstats, sur le tableau en mémoire:
+            # le raster est lu une fois au lieu d'être rouvert pour chaque zone
+            with rasterio.open(raster_path) as src:
+                zones_r = zones.to_crs(src.crs) if zones.crs != src.crs else zones
+                arr = src.read(1)
+                affine = src.transform
+            
+            results = zonal_stats(
+                zones_r,
+                arr,
+                affine=affine,
+                stats=stats,
+                categorical=categorical,
+                nodata=-9999,
+                all_touched=False,
+                raster_out=False,
+                geojson_out=False
+            )
+            
+            # Convertir en DataFrame
+            df_stats = pd.DataFrame(results)
         
         # Ajouter noms gouvernorats
         if 'governorate' in zones.columns:
@@ -137,6 +244,272 @@ class SpatialStats:
         
         return df_stats
     
+    def _zonal_stats(
+        self,
+        raster_paths: Dict[str, str],
+        zones: Optional[gpd.GeoDataFrame] = None,
+        stats: List[str] = None,
+        nodata: float = -9999
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Statistiques zonales (mean, sum, std, min, max, count) de plusieurs rasters.
+        
+        Point d'entrée unique de zonal_statistics_raster et de
+        calculate_awp_by_governorate: exactextract s'il est installé, sinon le moteur
+        par fenêtres (_compute_zonal_stats_fused).
+        
+        Returns:
+            Dictionnaire {nom_variable: DataFrame des statistiques par zone}
+        """
+        if zones is None:
+            zones = self.governorates
+        if stats is None:
+            stats = ['mean', 'sum', 'std', 'min', 'max', 'count']
+        
+        if not EXACTEXTRACT_AVAILABLE:
+            return self._compute_zonal_stats_fused(raster_paths, zones=zones, stats=stats, nodata=nodata)
+        
+        return {
+            name: self._compute_zonal_stats_exact(raster_path, zones, stats, nodata)
+            for name, raster_path in raster_paths.items()
+        }
+    
+    def _compute_zonal_stats_exact(
+        self,
+        raster_path: str,
+        zones: gpd.GeoDataFrame,
+        stats: List[str],
+        nodata: float = -9999
+    ) -> pd.DataFrame:
+        """
+        Statistiques zonales avec exactextract (C++), zone par zone.
+        
+        exactextract retourne les pixels touchés par chaque zone (valeurs et centres);
+        seuls ceux dont le centre est dans la zone sont retenus, comme rasterstats et
+        _compute_zonal_stats_fused: les trois moteurs donnent les mêmes chiffres.
+        Nodata explicite (nodata du raster, sinon la valeur fournie).
+        """
+        logger.info("Calcul statistiques zonales: %s", Path(raster_path).name)
+        rows = []
+        
+        with rasterio.open(raster_path) as src:
+            zones_r = zones.to_crs(src.crs) if src.crs and zones.crs != src.crs else zones
+            source = _NodataRasterioSource(src, nodata)
+            
+            # Une zone à la fois: mémoire bornée aux pixels de la plus grande zone
+            for i, geom in enumerate(zones_r.geometry.values):
+                values = np.empty(0)
+                if geom is not None and not geom.is_empty:
+                    pixels = exact_extract(
+                        source, zones_r.iloc[[i]], ['values', 'center_x', 'center_y'],
+                        output='pandas'
+                    ).iloc[0]
+                    values = np.asarray(pixels['values'], dtype=np.float64)
+                    shapely.prepare(geom)
+                    inside = shapely.contains_xy(geom, pixels['center_x'], pixels['center_y'])
+                    values = values[inside & ~np.isnan(values)]
+                
+                count = len(values)
+                rows.append({
+                    'mean': values.mean() if count else np.nan,
+                    'sum': values.sum() if count else np.nan,
+                    'std': values.std() if count else np.nan,
+                    'min': values.min() if count else np.nan,
+                    'max': values.max() if count else np.nan,
+                    'count': count
+                })
+        
+        return pd.DataFrame(rows, columns=list(self.ZONAL_STATS))[stats]
+    
+    def _iter_windows(self, height: int, width: int, size: int = 2048):
+        """
+        Découpe une grille (height, width) en fenêtres carrées d'au plus size pixels.
+        
+        Les tuiles ESA ne sont pas tuilées en interne: un découpage fixe évite les
+        fenêtres d'une seule ligne de block_windows.
+        """
+        for row_off in range(0, height, size):
+            for col_off in range(0, width, size):
+                yield Window(
+                    col_off, row_off,
+                    min(size, width - col_off),
+                    min(size, height - row_off)
+                )
+    
+    def _window_labels(
+        self,
+        src,
+        zones: gpd.GeoDataFrame,
+        window: Window,
+        cacheable: bool = False
+    ) -> np.ndarray:
+        """
+        Rastérise les zones sur une fenêtre d'un raster (identifiants 1..n, 0 = hors zones).
+        
+        Seules les zones dont l'emprise intersecte la fenêtre (index spatial) sont
+        rastérisées: la mémoire reste O(fenêtre) quelle que soit la taille du raster.
+        Pour les gouvernorats chargés (cacheable), les blocs sont mis en cache par
+        (crs, transform, shape, fenêtre) et réutilisés pour ETb, WPb et tout autre
+        raster de même grille; le cache est borné à LABEL_CACHE_MAX_BYTES (LRU).
+        
+        Args:
+            src: Dataset rasterio ouvert
+            zones: GeoDataFrame des zones, dans le CRS du raster
+            window: Fenêtre du raster
+            cacheable: True si zones provient des gouvernorats chargés
+            
+        Returns:
+            Grille int32 de la forme de la fenêtre (lecture seule si mise en cache)
+        """
+        if cacheable:
+            key = (
+                src.crs.to_string() if src.crs else None, tuple(src.transform), src.shape,
+                int(window.col_off), int(window.row_off), int(window.width), int(window.height)
+            )
+            labels = self._label_cache.get(key)
+            if labels is not None:
+                self._label_cache.move_to_end(key)
+                return labels
+        
+        labels = self._rasterize_window(src, zones, window)
+        
+        if cacheable:
+            labels.flags.writeable = False
+            self._label_cache[key] = labels
+            self._label_cache_bytes += labels.nbytes
+            while self._label_cache_bytes > self.LABEL_CACHE_MAX_BYTES and len(self._label_cache) > 1:
+                _, evicted = self._label_cache.popitem(last=False)
+                self._label_cache_bytes -= evicted.nbytes
+        return labels
+    
+    def _rasterize_window(self, src, zones: gpd.GeoDataFrame, window: Window) -> np.ndarray:
+        """Rastérise les zones qui intersectent une fenêtre (centre des pixels)."""
+        out_shape = (int(window.height), int(window.width))
+        geometries = zones.geometry.values
+        candidates = np.sort(zones.sindex.query(box(*src.window_bounds(window))))
+        shapes = [
+            (geometries[i], int(i) + 1) for i in candidates
+            if geometries[i] is not None and not geometries[i].is_empty
+        ]
+        if not shapes:
+            return np.zeros(out_shape, dtype=np.int32)
+        
+        return rasterize(
+            shapes,
+            out_shape=out_shape,
+            transform=src.window_transform(window),
+            fill=0,
+            dtype='int32'
+        )
+    
+    def _accumulate_zonal(
+        self,
+        data: np.ndarray,
+        labels: np.ndarray,
+        nodata: float,
+        sums: np.ndarray,
+        sumsq: np.ndarray,
+        counts: np.ndarray,
+        mins: np.ndarray,
+        maxs: np.ndarray
+    ) -> None:
+        """
+        Accumule (en place) somme, somme des carrés, effectif, min et max par zone.
+        
+        Args:
+            data: Bloc de valeurs
+            labels: Bloc d'identifiants de zone (0 = hors zones)
+            nodata: Valeur nodata à ignorer (les NaN sont aussi ignorés)
+            sums, sumsq, counts, mins, maxs: Accumulateurs de taille n_zones + 1
+        """
+        if NUMBA_AVAILABLE:
+            # Noyau compilé: une seule passe, accumulateurs locaux par thread
+            accumulate_zonal(data, labels, nodata, sums, sumsq, counts, mins, maxs)
+            return
+        
+        valid = (labels > 0) & (data != nodata) & ~np.isnan(data)
+        zone_ids = labels[valid]
+        values = data[valid].astype(np.float64)
+        
+        n_bins = len(sums)
+        sums += np.bincount(zone_ids, weights=values, minlength=n_bins)
+        sumsq += np.bincount(zone_ids, weights=values * values, minlength=n_bins)
+        counts += np.bincount(zone_ids, minlength=n_bins)
+        np.minimum.at(mins, zone_ids, values)
+        np.maximum.at(maxs, zone_ids, values)
+    
+    def _compute_zonal_stats_fused(
+        self,
+        raster_paths: Dict[str, str],
+        zones: Optional[gpd.GeoDataFrame] = None,
+        stats: List[str] = None,
+        nodata: float = -9999
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Calcule les statistiques zonales de plusieurs rasters, chacun lu une seule fois.
+        
+        Chaque raster est parcouru par fenêtres: les zones (reprojetées dans le CRS du
+        raster) sont rastérisées sur la fenêtre (centre des pixels, comme rasterstats),
+        puis somme, somme des carrés, effectif, min et max sont accumulés par zone.
+        La mémoire de travail reste O(fenêtre).
+        
+        Args:
+            raster_paths: Dictionnaire {nom_variable: chemin_raster}
+            zones: GeoDataFrame des zones (défaut: gouvernorats chargés)
+            stats: Statistiques parmi mean, sum, std, min, max, count
+            nodata: Valeur nodata à ignorer si le raster n'en définit pas (les NaN sont
+                    aussi ignorés)
+            
+        Returns:
+            Dictionnaire {nom_variable: DataFrame des statistiques par zone}
+        """
+        if zones is None:
+            zones = self.governorates
+        if stats is None:
+            stats = ['mean', 'sum', 'std', 'min', 'max', 'count']
+        
+        n_bins = len(zones) + 1
+        results = {}
+        
+        for name, raster_path in raster_paths.items():
+            logger.info("Calcul statistiques zonales: %s", Path(raster_path).name)
+            
+            sums = np.zeros(n_bins)
+            sumsq = np.zeros(n_bins)
+            counts = np.zeros(n_bins, dtype=np.int64)
+            mins = np.full(n_bins, np.inf)
+            maxs = np.full(n_bins, -np.inf)
+            
+            with rasterio.open(raster_path) as src:
+                cacheable = zones is self.governorates
+                zones_r = zones.to_crs(src.crs) if src.crs and zones.crs != src.crs else zones
+                raster_nodata = src.nodata if src.nodata is not None else nodata
+                
+                for window in self._iter_windows(src.height, src.width):
+                    data = src.read(1, window=window, out_dtype=np.float32)
+                    self._accumulate_zonal(
+                        data, self._window_labels(src, zones_r, window, cacheable), raster_nodata,
+                        sums, sumsq, counts, mins, maxs
+                    )
+            
+            counts = counts[1:]
+            empty = counts == 0
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = sums[1:] / counts
+                stds = np.sqrt(np.maximum(sumsq[1:] / counts - means * means, 0))
+            
+            columns = {
+                'mean': means,
+                'sum': np.where(empty, np.nan, sums[1:]),
+                'std': stds,
+                'min': np.where(empty, np.nan, mins[1:]),
+                'max': np.where(empty, np.nan, maxs[1:]),
+                'count': counts
+            }
+            results[name] = pd.DataFrame({stat: columns[stat] for stat in stats})
+        
+        return results
+    
     def aggregate_by_governorate(
         self,
         raster_path: str,
@@ -155,7 +528,7 @@ class SpatialStats:
         if self.governorates is None:
             raise ValueError("Shapefile des gouvernorats non chargé. Utilisez load_governorates()")
         
-        logger.info(f"Agrégation par gouvernorat: {variable_name}")
+        logger.info("Agrégation par gouvernorat: %s", variable_name)
         
         # Calculer statistiques zonales
         stats_df = self.zonal_statistics_raster(
@@ -164,15 +537,53 @@ class SpatialStats:
             stats=['mean', 'sum', 'std', 'count']
         )
         
-        # Fusionner avec GeoDataFrame
-        result = self.governorates.copy()
-        result[f'{variable_name}_mean'] = stats_df['mean']
-        result[f'{variable_name}_sum'] = stats_df['sum']
-        result[f'{variable_name}_std'] = stats_df['std']
-        result[f'{variable_name}_count'] = stats_df['count']
+        # Fusionner avec GeoDataFrame (assign: pas de copie explicite de la géométrie)
+        result = self.governorates.assign(**{
+            f'{variable_name}_{stat}': stats_df[stat].values
+            for stat in ['mean', 'sum', 'std', 'count']
+        })
         
         return result
     
+    def aggregate_many(
+        self,
+        raster_paths: List[str],
+        variable_names: List[str],
+        n_workers: Optional[int] = None
+    ) -> Dict[str, gpd.GeoDataFrame]:
+        """
+        Agrège plusieurs rasters par gouvernorat en parallèle (un processus par raster).
+        
+        Les statistiques zonales tiennent le GIL côté GDAL: les processus passent à
+        l'échelle, pas les threads. Chaque worker reçoit les gouvernorats en WKB et
+        les parse une seule fois.
+        
+        Args:
+            raster_paths: Chemins des rasters (ex: ETb de chaque année)
+            variable_names: Nom de variable associé à chaque raster
+            n_workers: Nombre de processus (défaut: nombre de CPU)
+            
+        Returns:
+            Dictionnaire {nom_variable: GeoDataFrame avec statistiques}
+        """
+        if self.governorates is None:
+            raise ValueError("Shapefile des gouvernorats non chargé. Utilisez load_governorates()")
+        if len(raster_paths) != len(variable_names):
+            raise ValueError("raster_paths et variable_names doivent avoir la même longueur")
+        
+        n_workers = min(n_workers or os.cpu_count() or 1, len(raster_paths))
+        logger.info("Agrégation de %s rasters sur %s processus", len(raster_paths), n_workers)
+        
+        zones_wkb = pd.DataFrame(self.governorates.to_wkb())
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_aggregate_worker,
+            initargs=(zones_wkb, self.governorates.crs)
+        ) as executor:
+            results = dict(executor.map(_aggregate_worker, raster_paths, variable_names))
+        
+        return results
+    
     def calculate_awp_by_governorate(
         self,
         etb_raster_path: str,
@@ -201,42 +612,52 @@ class SpatialStats:
         
         logger.info("Calcul AWP par gouvernorat")
         
-        # 1. Calculer statistiques zonales ETb et WPb
-        etb_stats = self.aggregate_by_governorate(etb_raster_path, 'etb')
-        wpb_stats = self.aggregate_by_governorate(wpb_raster_path, 'wpb')
+        # 1. Calculer statistiques zonales ETb et WPb (une seule lecture par raster)
+        zonal = self._zonal_stats(
+            {'etb': etb_raster_path, 'wpb': wpb_raster_path},
+            stats=['mean', 'sum', 'std', 'count']
+        )
+        
+        etb_stats = self.governorates.assign(**{
+            f'etb_{stat}': zonal['etb'][stat].values
+            for stat in ['mean', 'sum', 'std', 'count']
+        })
         
         # 2. Fusionner avec surfaces irriguées
-        result = etb_stats.copy()
-        result = result.merge(
+        result = etb_stats.merge(
             irrigation_areas_df,
             on='governorate',
             how='left'
         )
-        result['wpb_mean'] = wpb_stats['wpb_mean']
+        result['wpb_mean'] = zonal['wpb']['mean'].values
+        
+        # Calculs sur tableaux numpy float32 (pas de promotion float64 implicite)
+        etb_mean = result['etb_mean'].to_numpy(dtype=np.float32)
+        area_ha = result['area_irrigated_ha'].to_numpy(dtype=np.float32)
+        wpb_mean = result['wpb_mean'].to_numpy(dtype=np.float32)
         
         # 3. Calculer V_ETb par gouvernorat (ETb moyen × surface irriguée)
-        result['v_etb_m3'] = result['etb_mean'] * result['area_irrigated_ha'] * 10000  # ha → m²
+        v_etb_m3 = etb_mean * area_ha * np.float32(10000)  # ha → m²
         
         # 4. Répartir GVA et V_a proportionnellement aux surfaces irriguées
         total_irrigated_ha = irrigation_areas_df['area_irrigated_ha'].sum()
-        result['gva_irrigated'] = (
-            gva_total * (1 - c_r) * 
-            result['area_irrigated_ha'] / total_irrigated_ha
-        )
-        result['v_a_m3'] = (
-            v_a_total * 
-            result['area_irrigated_ha'] / total_irrigated_ha
-        )
+        area_share = area_ha / np.float32(total_irrigated_ha)
+        gva_irrigated = np.float32(gva_total * (1 - c_r)) * area_share
+        v_a_m3 = np.float32(v_a_total) * area_share
+        
+        result['v_etb_m3'] = v_etb_m3
+        result['gva_irrigated'] = gva_irrigated
+        result['v_a_m3'] = v_a_m3
         
         # 5. Calculer AWP par gouvernorat
-        result['awp_we'] = result['gva_irrigated'] / result['v_a_m3']
-        result['awp_wp1'] = result['gva_irrigated'] / result['v_etb_m3']
-        result['awp_wp2'] = result['wpb_mean'] * 0.05  # Prix biomasse 0.05 USD/kg
+        result['awp_we'] = gva_irrigated / v_a_m3
+        result['awp_wp1'] = gva_irrigated / v_etb_m3
+        result['awp_wp2'] = wpb_mean * np.float32(0.05)  # Prix biomasse 0.05 USD/kg
         
         # 6. Calculer irrigation efficiency
-        result['irrigation_efficiency'] = result['v_etb_m3'] / result['v_a_m3']
+        result['irrigation_efficiency'] = v_etb_m3 / v_a_m3
         
-        logger.info(f"✓ AWP calculé pour {len(result)} gouvernorats")
+        logger.info("✓ AWP calculé pour %s gouvernorats", len(result))
         return result
     
     def rank_governorates(
@@ -256,11 +677,12 @@ class SpatialStats:
         Returns:
             GeoDataFrame trié avec rang
         """
-        result = gdf.copy()
-        result = result.sort_values(metric, ascending=ascending)
-        result['rank'] = range(1, len(result) + 1)
+        # sort_values renvoie déjà un nouvel objet: pas de copie préalable
+        result = gdf.sort_values(metric, ascending=ascending).assign(
+            rank=np.arange(1, len(gdf) + 1)
+        )
         
-        logger.info(f"Gouvernorats classés par {metric}")
+        logger.info("Gouvernorats classés par %s", metric)
         return result
     
     def identify_hotspots(
@@ -280,21 +702,27 @@ class SpatialStats:
         Returns:
             GeoDataFrame avec classification hotspot
         """
-        result = gdf.copy()
+        values = gdf[metric].to_numpy(dtype=np.float64)
+        
+        # Mêmes conventions que pandas: NaN ignorés, écart-type échantillon (ddof=1)
+        mean_val = np.nanmean(values)
+        std_val = np.nanstd(values, ddof=1)
         
-        mean_val = result[metric].mean()
-        std_val = result[metric].std()
+        z_scores = (values - mean_val) / std_val
         
-        z_scores = (result[metric] - mean_val) / std_val
+        hotspot = np.select(
+            [z_scores > threshold_std, z_scores < -threshold_std],
+            ['high', 'low'],
+            default='normal'
+        )
         
-        result['z_score'] = z_scores
-        result['hotspot'] = 'normal'
-        result.loc[z_scores > threshold_std, 'hotspot'] = 'high'
-        result.loc[z_scores < -threshold_std, 'hotspot'] = 'low'
+        # assign: nouvelles colonnes sans copie explicite de la géométrie
+        result = gdf.assign(z_score=z_scores, hotspot=hotspot)
         
-        logger.info(f"Hotspots identifiés: {metric}")
-        logger.info(f"  High: {(result['hotspot']=='high').sum()}")
-        logger.info(f"  Normal: {(result['hotspot']=='normal').sum()}")
-        logger.info(f"  Low: {(result['hotspot']=='low').sum()}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Hotspots identifiés: %s", metric)
+            logger.info("  High: %s", (result['hotspot']=='high').sum())
+            logger.info("  Normal: %s", (result['hotspot']=='normal').sum())
+            logger.info("  Low: %s", (result['hotspot']=='low').sum())
         
         return result
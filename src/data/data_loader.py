@@ -10,13 +10,15 @@ import xarray as xr
 import rasterio
 import geopandas as gpd
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 class DataLoader:
     """Classe pour charger différents types de données."""
     
+    # Blocs dask suggérés (load_raster(chunks=...)): une année journalière × tuiles de 1024 pixels
+    DEFAULT_CHUNKS = {'time': 365, 'x': 1024, 'y': 1024}
+    
     def __init__(self, data_root: str = "../data"):
         """
         Initialise le chargeur de données.
@@ -25,20 +27,31 @@ class DataLoader:
             data_root: Répertoire racine des données
         """
         self.data_root = Path(data_root)
-        logger.info(f"DataLoader initialisé avec racine: {data_root}")
+        logger.info("DataLoader initialisé avec racine: %s", data_root)
     
-    def load_raster(self, filepath: str) -> xr.DataArray:
+    def load_raster(
+        self,
+        filepath: str,
+        chunks: Optional[dict] = None
+    ) -> xr.DataArray:
         """
         Charge un fichier raster.
         
         Args:
             filepath: Chemin vers le fichier raster
+            chunks: Taille des blocs dask par dimension (ex: DEFAULT_CHUNKS pour les
+                piles multi-annuelles); None = tableau numpy, comme auparavant
             
         Returns:
             DataArray xarray
         """
-        logger.info(f"Chargement du raster: {filepath}")
-        return xr.open_dataarray(filepath)
+        logger.info("Chargement du raster: %s", filepath)
+        data = xr.open_dataarray(filepath)
+        if chunks is None:
+            return data
+        
+        # Ne découper que les dimensions présentes (un raster 2D n'a pas de 'time')
+        return data.chunk({dim: size for dim, size in chunks.items() if dim in data.dims})
     
     def load_vector(self, filepath: str) -> gpd.GeoDataFrame:
         """
@@ -50,7 +63,7 @@ class DataLoader:
         Returns:
             GeoDataFrame
         """
-        logger.info(f"Chargement du vecteur: {filepath}")
+        logger.info("Chargement du vecteur: %s", filepath)
         return gpd.read_file(filepath)
     
     def load_et_data(self, year: int) -> xr.Dataset:
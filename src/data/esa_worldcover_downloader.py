@@ -5,13 +5,16 @@ Source: https://esa-worldcover.org/
 """
 
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 import yaml
 import requests
+from requests.adapters import HTTPAdapter
 import rasterio
+from rasterio.enums import Resampling
 from rasterio.merge import merge
 from rasterio.mask import mask
 from shapely.geometry import box
-import numpy as np
 
 class ESAWorldCoverDownloader:
     """
@@ -45,6 +48,12 @@ class ESAWorldCoverDownloader:
         
         os.makedirs(self.output_dir, exist_ok=True)
         
+        # Session HTTP partagée: connexions TCP/TLS réutilisées entre tuiles et threads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
         print(f"✓ ESA WorldCover Downloader initialisé")
         print(f"  Source: ESA WorldCover (10m résolution)")
         print(f"  Années disponibles: 2020, 2021")
@@ -84,31 +93,37 @@ class ESAWorldCoverDownloader:
         if os.path.exists(output_file):
             return output_file
         
-        print(f"  📥 {tile_name}...", end=" ")
-        
+        # Une seule ligne par tuile: les téléchargements tournent en parallèle
         try:
             # Télécharger avec streaming (fichiers volumineux)
-            response = requests.get(url, timeout=300, stream=True)
+            response = self.session.get(url, timeout=300, stream=True)
             
             if response.status_code == 200:
-                total_size = int(response.headers.get('content-length', 0))
-                
+                # Copie du flux brut vers le disque en C, par blocs de 8 MB
+                response.raw.decode_content = True
                 with open(output_file, 'wb') as f:
-                    downloaded = 0
-                    for chunk in response.iter_content(chunk_size=1024*1024):  # 1MB chunks
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
+                    shutil.copyfileobj(response.raw, f, length=8*1024*1024)
+                
+                # Fichier écrit une fois, relu plus tard: inutile de le garder en cache
+                if hasattr(os, 'posix_fadvise'):
+                    fd = os.open(output_file, os.O_RDONLY)
+                    try:
+                        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+                    finally:
+                        os.close(fd)
                 
                 size_mb = os.path.getsize(output_file) / (1024 * 1024)
-                print(f"✓ ({size_mb:.0f}MB)")
+                print(f"  📥 {tile_name}... ✓ ({size_mb:.0f}MB)")
                 return output_file
             else:
-                print(f"✗ (Erreur {response.status_code})")
+                print(f"  📥 {tile_name}... ✗ (Erreur {response.status_code})")
                 return None
                 
         except Exception as e:
-            print(f"✗ ({str(e)[:50]})")
+            # Ne pas laisser une tuile partielle passer pour déjà téléchargée
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            print(f"  📥 {tile_name}... ✗ ({str(e)[:50]})")
             return None
     
     def download_and_crop_land_cover(self, year=2020):
@@ -129,173 +144,68 @@ class ESAWorldCoverDownloader:
         
         # Télécharger les tuiles
         tiles = self.get_tiles_for_bbox()
+        if not tiles:
+            print("✗ Aucune tuile pour la bbox")
+            return None
         print(f"\n📦 Téléchargement de {len(tiles)} tuiles...")
         
-        tile_files = []
-        for tile in tiles:
-            tile_file = self.download_tile(tile, year)
-            if tile_file and os.path.exists(tile_file):
-                tile_files.append(tile_file)
+        # Téléchargements en parallèle (limités par le réseau, pas par le CPU)
+        with ThreadPoolExecutor(max_workers=min(len(tiles), 8)) as executor:
+            results = list(executor.map(lambda tile: self.download_tile(tile, year), tiles))
+        
+        tile_files = [f for f in results if f and os.path.exists(f)]
         
         if not tile_files:
             print("✗ Aucune tuile téléchargée")
             return None
         
-        print(f"\n🔗 Découpage des tuiles à la bbox Tunisie...")
+        print(f"\n🔗 Fusion et découpage des tuiles à la bbox Tunisie...")
         
+        src_files = []
         try:
-            # Approche optimisée: découper chaque tuile puis fusionner
-            cropped_tiles = []
-            temp_dir = f"{self.output_dir}/LCC/temp"
-            os.makedirs(temp_dir, exist_ok=True)
+            # Ne garder que les tuiles qui intersectent la bbox (lecture des en-têtes seulement)
+            for tile_file in tile_files:
+                src = rasterio.open(tile_file)
+                tile_bounds = src.bounds
+                intersects = not (
+                    tile_bounds.right < self.bbox[0] or
+                    tile_bounds.left > self.bbox[2] or
+                    tile_bounds.top < self.bbox[1] or
+                    tile_bounds.bottom > self.bbox[3]
+                )
+                if intersects:
+                    src_files.append(src)
+                else:
+                    print(f"  ✗ {os.path.basename(tile_file)} (hors zone)")
+                    src.close()
             
-            for i, tile_file in enumerate(tile_files):
-                print(f"  📐 Découpage tuile {i+1}/{len(tile_files)}...", end=" ")
-                
-                try:
-                    with rasterio.open(tile_file) as src:
-                        # Vérifier si la tuile intersecte la bbox
-                        tile_bounds = src.bounds
-                        
-                        # Intersection bbox
-                        intersects = not (
-                            tile_bounds.right < self.bbox[0] or
-                            tile_bounds.left > self.bbox[2] or
-                            tile_bounds.top < self.bbox[1] or
-                            tile_bounds.bottom > self.bbox[3]
-                        )
-                        
-                        if not intersects:
-                            print("✗ (hors zone)")
-                            continue
-                        
-                        # Calculer la fenêtre d'intersection
-                        try:
-                            from rasterio.windows import from_bounds
-                            
-                            # Calculer la fenêtre pour la bbox (en coordonnées géographiques)
-                            window = from_bounds(
-                                self.bbox[0],  # left (lon_min)
-                                self.bbox[1],  # bottom (lat_min)
-                                self.bbox[2],  # right (lon_max)
-                                self.bbox[3],  # top (lat_max)
-                                src.transform
-                            )
-                            
-                            # Lire la fenêtre
-                            out_image = src.read(window=window)
-                            out_transform = src.window_transform(window)
-                            
-                            # Vérifier si les données sont valides
-                            if out_image.size == 0:
-                                print("✗ (fenêtre vide)")
-                                continue
-                            
-                            # Sauvegarder le découpage
-                            temp_file = f"{temp_dir}/cropped_{i}.tif"
-                            profile = src.profile.copy()
-                            profile.update({
-                                'height': out_image.shape[1] if out_image.ndim == 3 else out_image.shape[0],
-                                'width': out_image.shape[2] if out_image.ndim == 3 else out_image.shape[1],
-                                'transform': out_transform,
-                                'compress': 'lzw'
-                            })
-                            
-                            with rasterio.open(temp_file, 'w', **profile) as dst:
-                                dst.write(out_image)
-                            
-                            size_mb = os.path.getsize(temp_file) / (1024**2)
-                            cropped_tiles.append(temp_file)
-                            print(f"✓ ({size_mb:.1f}MB)")
-                            
-                        except ValueError:
-                            print("✗ (hors bbox)")
-                            continue
-                            
-                except Exception as e:
-                    print(f"✗ ({str(e)[:30]})")
-                    continue
-            
-            if not cropped_tiles:
-                print("✗ Aucune tuile découpée")
+            if not src_files:
+                print("✗ Aucune tuile dans la zone")
                 return None
             
-            # Si une seule tuile, copier directement
-            if len(cropped_tiles) == 1:
-                print(f"\n📋 Une seule tuile, copie directe...")
-                import shutil
-                shutil.copy2(cropped_tiles[0], output_file)
-            else:
-                print(f"\n🔗 Fusion de {len(cropped_tiles)} tuiles...")
-                
-                # Méthode robuste: construire mosaïque manuellement
-                try:
-                    # Ouvrir toutes les tuiles
-                    src_files = [rasterio.open(f) for f in cropped_tiles]
-                    
-                    # Calculer l'étendue globale
-                    min_x = min(src.bounds.left for src in src_files)
-                    max_x = max(src.bounds.right for src in src_files)
-                    min_y = min(src.bounds.bottom for src in src_files)
-                    max_y = max(src.bounds.top for src in src_files)
-                    
-                    # Utiliser la résolution de la première tuile
-                    res_x, res_y = src_files[0].res
-                    width = int((max_x - min_x) / res_x)
-                    height = int((max_y - min_y) / abs(res_y))
-                    
-                    transform = rasterio.transform.from_bounds(min_x, min_y, max_x, max_y, width, height)
-                    
-                    # Créer le fichier de sortie
-                    profile = src_files[0].profile.copy()
-                    profile.update({
-                        'width': width,
-                        'height': height,
-                        'transform': transform,
-                        'compress': 'lzw'
-                    })
-                    
-                    print(f"  📏 Mosaïque: {width}x{height} pixels")
-                    
-                    # Écrire tuile par tuile
-                    with rasterio.open(output_file, 'w', **profile) as dst:
-                        # Initialiser avec zéro
-                        dst.write(np.zeros((height, width), dtype=profile['dtype']), 1)
-                        
-                        # Copier chaque tuile
-                        for i, src in enumerate(src_files):
-                            print(f"  ✍️ Tuile {i+1}/{len(src_files)}...", end=" ")
-                            
-                            # Lire les données
-                            data = src.read(1)
-                            
-                            # Calculer la fenêtre dans le fichier de sortie
-                            src_window = rasterio.windows.from_bounds(*src.bounds, dst.transform)
-                            
-                            # Écrire dans la fenêtre
-                            dst.write(data, 1, window=src_window)
-                            print("✓")
-                    
-                    # Fermer
-                    for src in src_files:
-                        src.close()
-                    
-                except Exception as e:
-                    print(f"  ✗ Erreur: {str(e)[:50]}")
-                    for src in src_files:
-                        try:
-                            src.close()
-                        except:
-                            pass
-                    return None
-            
-            # Nettoyer les fichiers temporaires
-            for temp_file in cropped_tiles:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
+            # Mosaïque + découpage bbox en une seule écriture (pas de fichiers temporaires)
+            print(f"  🔗 Fusion de {len(src_files)} tuiles...")
+            merge(
+                src_files,
+                bounds=tuple(self.bbox),
+                nodata=0,  # classe 0 = pas de données (ESA WorldCover)
+                dst_path=output_file,
+                dst_kwds={
+                    'compress': 'deflate',
+                    'predictor': 2,
+                    'tiled': True,
+                    'blockxsize': 512,
+                    'blockysize': 512,
+                    'BIGTIFF': 'IF_SAFER',
+                    # Blocs entièrement nodata (mer, hors tuiles) non écrits sur disque
+                    'SPARSE_OK': 'TRUE'
+                }
+            )
             
-            if os.path.exists(temp_dir):
-                os.rmdir(temp_dir)
+            # Overviews internes (classes catégorielles → nearest) pour les lectures fenêtrées
+            with rasterio.open(output_file, 'r+') as dst:
+                dst.build_overviews([2, 4, 8, 16], Resampling.nearest)
+                dst.update_tags(ns='rio_overview', resampling='nearest')
             
             size_mb = os.path.getsize(output_file) / (1024 * 1024)
             print(f"✓ Fichier créé: {output_file} ({size_mb:.1f} MB)")
@@ -304,11 +214,14 @@ class ESAWorldCoverDownloader:
             
         except Exception as e:
             print(f"✗ Erreur: {e}")
-            # Nettoyer
-            if 'temp_dir' in locals() and os.path.exists(temp_dir):
-                import shutil
-                shutil.rmtree(temp_dir, ignore_errors=True)
+            # Ne pas laisser une mosaïque partielle
+            if os.path.exists(output_file):
+                os.remove(output_file)
             return None
+        
+        finally:
+            for src in src_files:
+                src.close()
     
     def get_legend(self):
         """
@@ -6,9 +6,9 @@ import logging
 from typing import Optional, Tuple
 
 import numpy as np
+import shapely
 import xarray as xr
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
@@ -42,21 +42,39 @@ class DataPreprocessor:
         Returns:
             Données nettoyées
         """
-        logger.info(f"Suppression des outliers avec méthode: {method}")
+        logger.info("Suppression des outliers avec méthode: %s", method)
         
         if method == "iqr":
-            q1 = data.quantile(0.25)
-            q3 = data.quantile(0.75)
+            if isinstance(data.data, np.ndarray):
+                # Un seul tri sur les valeurs brutes (NaN ignorés, comme xarray)
+                q1, q3 = np.nanpercentile(data.values, [25, 75])
+            else:
+                # Données dask: un seul appel quantile pour les deux quartiles; quantile
+                # exige un seul bloc sur les dimensions réduites (toutes ici)
+                quartiles = data.chunk({dim: -1 for dim in data.dims}).quantile([0.25, 0.75]).values
+                q1, q3 = quartiles[0], quartiles[1]
             iqr = q3 - q1
             lower = q1 - threshold * iqr
             upper = q3 + threshold * iqr
             return data.where((data >= lower) & (data <= upper))
         
         elif method == "zscore":
-            mean = data.mean()
-            std = data.std()
-            z_scores = np.abs((data - mean) / std)
-            return data.where(z_scores < threshold)
+            if not isinstance(data.data, np.ndarray):
+                mean = data.mean()
+                std = data.std()
+                z_scores = np.abs((data - mean) / std)
+                return data.where(z_scores < threshold)
+            
+            # Moyenne et écart-type (ddof=0, NaN ignorés) depuis (n, somme, somme des carrés)
+            arr = data.values
+            values = arr[~np.isnan(arr)]
+            n = max(values.size, 1)
+            mean = values.sum(dtype=np.float64) / n
+            std = np.sqrt(max(np.einsum('i,i->', values, values, dtype=np.float64) / n - mean * mean, 0.0))
+            
+            # |x - mean| / std < threshold  ⇔  |x - mean| < threshold * std
+            keep = np.abs(arr - mean) < threshold * std
+            return data.where(xr.DataArray(keep, coords=data.coords, dims=data.dims))
         
         return data
     
@@ -77,10 +95,36 @@ class DataPreprocessor:
         Returns:
             Données masquées
         """
-        logger.info(f"Masquage par classes de couverture: {classes}")
+        logger.info("Masquage par classes de couverture: %s", classes)
         mask = lcc.isin(classes)
         return data.where(mask)
     
+    def mask_by_geometry(
+        self,
+        data: xr.DataArray,
+        geometry
+    ) -> xr.DataArray:
+        """
+        Masque les pixels dont le centre est hors d'une géométrie.
+        
+        Args:
+            data: Données à masquer (coordonnées x/y des centres de pixels)
+            geometry: Géométrie shapely, dans le CRS des données
+            
+        Returns:
+            Données masquées
+        """
+        logger.info("Masquage par géométrie")
+        # Test point-dans-polygone vectorisé (GEOS), géométrie préparée une fois
+        shapely.prepare(geometry)
+        inside = shapely.contains_xy(
+            geometry,
+            data.x.values[np.newaxis, :],
+            data.y.values[:, np.newaxis]
+        )
+        mask = xr.DataArray(inside, coords={'y': data.y, 'x': data.x}, dims=('y', 'x'))
+        return data.where(mask)
+    
     def resample_temporal(
         self,
         data: xr.DataArray,
@@ -96,5 +140,5 @@ class DataPreprocessor:
         Returns:
             Données rééchantillonnées
         """
-        logger.info(f"Rééchantillonnage temporel: {freq}")
+        logger.info("Rééchantillonnage temporel: %s", freq)
         return data.resample(time=freq).sum()
@@ -3,14 +3,27 @@ Module pour télécharger les données WaPOR v3 via l'API REST
 Basé sur: https://wapor.apps.fao.org/
 """
 
+import asyncio
+import json
 import os
+import queue
+import re
+import shutil
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import yaml
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
 from tqdm import tqdm
 import numpy as np
 import rasterio
-from rasterio.windows import from_bounds
+from rasterio.windows import Window, from_bounds
 
 try:
     from osgeo import gdal
@@ -19,11 +32,74 @@ except ImportError:
     GDAL_AVAILABLE = False
     print("ℹ️  GDAL non disponible - utilisation de rasterio pour le découpage")
 
+try:
+    import numcodecs
+    import zarr
+    ZARR_AVAILABLE = True
+except ImportError:
+    ZARR_AVAILABLE = False
+
+try:
+    import httpx
+    import h2  # noqa: F401 - requis par httpx pour HTTP/2
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+# Année (19xx/20xx) non entourée d'autres chiffres dans un code de raster
+YEAR_PATTERN = re.compile(r'(?<!\d)(?:19|20)\d{2}(?!\d)')
+
+def _next_href(links):
+    """URL du lien "next" d'une page de l'API (None sur la dernière page)"""
+    return next((x["href"] for x in links if x["rel"] == "next"), None)
+
+
 class WaPORDownloader:
     """
     Classe pour télécharger les données WaPOR pour la Tunisie
     """
     
+    # Variables annuelles: dossier → (variable du mapset, période, niveau, préfixe, libellé)
+    VARIABLES = {
+        'ET': ('AETI', 'A', 2, 'AETI', 'Évapotranspiration annuelle'),
+        'TBP': ('T', 'A', 2, 'TBP', 'Transpiration annuelle'),
+        'PCP': ('PCP', 'A', 1, 'PCP', 'Précipitations annuelles'),
+        'LCC': ('LCC', 'A', 1, 'LCC', 'Couverture du sol'),
+    }
+    
+    # Sorties GeoTIFF tuilées, DEFLATE + prédicteur flottant (sorties float32 en unités
+    # physiques); NUM_THREADS est ajouté selon le nombre de téléchargements parallèles
+    GTIFF_CREATION_OPTIONS = [
+        'TILED=YES',
+        'BLOCKXSIZE=256',
+        'BLOCKYSIZE=256',
+        'COMPRESS=DEFLATE',
+        'PREDICTOR=3'
+    ]
+    
+    # Dossiers de sortie déjà créés (partagé entre instances: état du système de fichiers)
+    _created_dirs = set()
+    
+    # Durée de validité du cache disque des listes de rasters (secondes)
+    CATALOG_CACHE_TTL = 24 * 3600
+    
+    # Options GDAL pour la lecture des COG via /vsicurl/: en-tête lu en une requête,
+    # lectures de tuiles regroupées, pas de sondage des fichiers voisins.
+    # Appliquées uniquement pendant les téléchargements (voir _gdal_env)
+    GDAL_VSICURL_CONFIG = {
+        'CPL_VSIL_CURL_CHUNK_SIZE': '1048576',
+        'GDAL_INGESTED_BYTES_AT_OPEN': '65536',  # en-tête COG (IFD + offsets des tuiles)
+        'GDAL_HTTP_MULTIPLEX': 'YES',
+        'GDAL_HTTP_VERSION': '2',
+        'VSI_CACHE': 'TRUE',
+        'VSI_CACHE_SIZE': '67108864',
+        'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR',
+        'CPL_VSIL_CURL_ALLOWED_EXTENSIONS': '.tif',
+        'CPL_VSIL_CURL_CACHE_SIZE': '200000000',
+        'CPL_VSIL_CURL_USE_HEAD': 'NO',
+        'GDAL_HTTP_MERGE_CONSECUTIVE_RANGES': 'YES'
+    }
+    
     def __init__(self, config_path='config/config.yaml'):
         """
         Initialise le downloader avec la configuration
@@ -40,17 +116,66 @@ class WaPORDownloader:
         # Créer les dossiers de sortie
         os.makedirs(self.output_dir, exist_ok=True)
         
+        # Listes de rasters par mapset, récupérées une fois par session
+        self._rasters_cache = {}
+        # Support des requêtes de plage (Accept-Ranges) par hôte
+        self._range_support = {}
+        # Fenêtres bbox → pixels, par grille source
+        self._window_cache = {}
+        
+        # Session HTTP partagée: connexions TCP/TLS réutilisées pour la pagination du catalogue
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=32,
+            max_retries=Retry(total=5, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            'User-Agent': 'WaPORDownloader/1.0',
+            'Accept-Encoding': 'gzip'
+        })
+        
+        # Client HTTP/2 (httpx) pour le catalogue et les sondes HEAD: les petites requêtes
+        # sont multiplexées sur une seule connexion TLS. Sans httpx: session requests.
+        self.http = None
+        if HTTPX_AVAILABLE:
+            self.http = httpx.Client(
+                transport=httpx.HTTPTransport(
+                    http2=True,
+                    retries=3,
+                    limits=httpx.Limits(max_keepalive_connections=8, max_connections=16)
+                ),
+                headers={'User-Agent': 'WaPORDownloader/1.0'},
+                follow_redirects=True,
+                timeout=30.0
+            )
+        
+        # Téléchargements parallèles; les CPU sont partagés entre eux pour les threads
+        # GDAL (décodage, compression) au lieu de ALL_CPUS par téléchargement
+        self.download_workers = max(1, self.config.get('processing', {}).get('download_workers', 8))
+        self.gdal_threads = max(1, (os.cpu_count() or 1) // self.download_workers)
+        
         print(f"✓ WaPOR v3 Downloader initialisé")
         print(f"  API: {self.base_url}")
         print(f"  Période: {self.years[0]}-{self.years[-1]}")
         print(f"  Zone: Tunisia (bbox: {self.bbox})")
     
+    def close(self):
+        """
+        Ferme la session HTTP
+        """
+        self.session.close()
+        if self.http is not None:
+            self.http.close()
+    
     def connect_api(self):
         """
         Se connecter à l'API WaPOR v3
         """
         try:
-            response = requests.get(self.base_url, timeout=10)
+            response = self._catalog_get(self.base_url, timeout=10)
             response.raise_for_status()
             print(f"✓ Connexion à l'API WaPOR v3 réussie")
             return True
@@ -63,21 +188,113 @@ class WaPORDownloader:
         """
         Collecte les réponses paginées de l'API WaPOR
         (Fonction officielle du notebook WaPOR)
+        
+        Avec httpx, les pages sont récupérées en asynchrone sur HTTP/2; sans httpx,
+        ou si une boucle asyncio tourne déjà (Jupyter), pagination séquentielle.
+        """
+        if HTTPX_AVAILABLE and not self._event_loop_running():
+            items = asyncio.run(self._collect_async(url))
+        else:
+            items = self._collect_sync(url)
+        
+        if isinstance(info, list):
+            # Clés figées une fois; dict.get appliqué en C via map (clés absentes → None)
+            keys = tuple(info)
+            return sorted(tuple(map(x.get, keys)) for x in items)
+        return items
+    
+    def _event_loop_running(self):
+        """
+        True si appelé depuis une boucle asyncio active (asyncio.run impossible)
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return True
+    
+    def _collect_sync(self, url):
+        """
+        Pagination séquentielle (liens "next"), sur HTTP/2 si httpx est disponible
         """
-        data = {"links": [{"rel": "next", "href": url}]}
-        output = list()
-        while "next" in [x["rel"] for x in data["links"]]:
-            url_ = [x["href"] for x in data["links"] if x["rel"] == "next"][0]
-            response = requests.get(url_)
+        items = list()
+        url_ = url
+        while url_:
+            response = self._catalog_get(url_, timeout=30)
             response.raise_for_status()
             data = response.json()["response"]
-            if isinstance(info, list):
-                output += [tuple(x.get(y) for y in info) for x in data["items"]]
-            else:
-                output += data["items"]
-        if isinstance(info, list):
-            output = sorted(output)
-        return output
+            items.extend(data["items"])
+            url_ = _next_href(data["links"])
+        return items
+    
+    def _catalog_get(self, url, timeout=30):
+        """
+        GET sur le catalogue: client httpx HTTP/2 si disponible, sinon session requests
+        """
+        if self.http is not None:
+            return self.http.get(url, timeout=timeout)
+        return self.session.get(url, timeout=timeout)
+    
+    async def _collect_async(self, url):
+        """
+        Pagination asynchrone: si l'API annonce le nombre total d'éléments, les pages
+        restantes sont demandées en parallèle; sinon, ou si les pages obtenues ne
+        correspondent pas à ce total, les liens "next" sont suivis sur une même
+        connexion HTTP/2.
+        """
+        async with httpx.AsyncClient(
+            # Reprises dans _get_page_async uniquement (pas de retries= du transport)
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_connections=16)
+            ),
+            timeout=30,
+            headers={'User-Agent': self.session.headers['User-Agent']},
+            follow_redirects=True
+        ) as client:
+            data = await self._get_page_async(client, url)
+            items = list(data["items"])
+            next_url = _next_href(data["links"])
+            
+            total = data.get("totalItems")
+            limit = data.get("limit")
+            if (next_url and isinstance(total, int) and isinstance(limit, int)
+                    and limit > 0 and total > len(items)):
+                # Toutes les pages connues d'avance: une requête par page, en parallèle
+                page_urls = [
+                    httpx.URL(url).copy_merge_params({'offset': offset, 'limit': limit})
+                    for offset in range(len(items), total, limit)
+                ]
+                pages = await asyncio.gather(*(self._get_page_async(client, u) for u in page_urls))
+                paged = items + [item for page in pages for item in page["items"]]
+                # offset/limit ignorés ou total inexact: pages incomplètes ou en double
+                if len(paged) == total and len({x.get("code") for x in paged}) == total:
+                    return paged
+            
+            while next_url:
+                data = await self._get_page_async(client, next_url)
+                items.extend(data["items"])
+                next_url = _next_href(data["links"])
+        
+        return items
+    
+    async def _get_page_async(self, client, url, retries=5):
+        """
+        GET d'une page du catalogue avec reprises (erreurs réseau, 502/503/504)
+        
+        Mêmes limites que la session requests (Retry(total=5, backoff_factor=0.3)):
+        5 reprises au plus, attentes 0, 0.6, 1.2, 2.4, 4.8 s.
+        """
+        for attempt in range(retries + 1):
+            try:
+                response = await client.get(url)
+                if response.status_code not in (502, 503, 504) or attempt == retries:
+                    response.raise_for_status()
+                    return response.json()["response"]
+            except httpx.TransportError:
+                if attempt == retries:
+                    raise
+            await asyncio.sleep(0.3 * 2 ** attempt if attempt else 0)
     
     def list_available_mapsets(self):
         """
@@ -96,16 +313,60 @@ class WaPORDownloader:
     def get_rasters_for_mapset(self, mapset_code):
         """
         Récupère tous les rasters d'un mapset spécifique
+        
+        La liste est mise en cache sur disque (JSON) pendant CATALOG_CACHE_TTL secondes:
+        les exécutions suivantes évitent de re-paginer le catalogue.
         """
+        cache_file = Path(self.output_dir) / '.catalog_cache' / f'{mapset_code}.json'
+        if cache_file.exists() and time.time() - cache_file.stat().st_mtime < self.CATALOG_CACHE_TTL:
+            return [tuple(item) for item in json.loads(cache_file.read_text())]
+        
         try:
             mapset_url = f"{self.base_url}/{mapset_code}/rasters"
             all_rasters = self.collect_responses(mapset_url, info=["code", "downloadUrl"])
-            return all_rasters
         except Exception as e:
             print(f"✗ Erreur: {e}")
             return []
+        
+        if all_rasters:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            cache_file.write_text(json.dumps(all_rasters))
+        return all_rasters
     
-    def download_raster(self, tif_url, output_filepath, bbox=None, use_gdal=True):
+    def _index_by_year(self, rasters):
+        """
+        Indexe une liste de (code, url) par année, en une seule passe
+        
+        L'année est un jeton de 4 chiffres isolé dans le code (ex: L2-AETI-A.2018),
+        ce qui évite les faux positifs d'une recherche de sous-chaîne.
+        """
+        index = {}
+        for code, url in rasters:
+            match = YEAR_PATTERN.search(code)
+            if match:
+                index.setdefault(int(match.group(0)), (code, url))
+        return index
+    
+    @contextmanager
+    def _gdal_env(self, num_threads=None):
+        """
+        Applique GDAL_VSICURL_CONFIG au thread courant pour la durée du bloc
+        
+        Les options ne fuient pas vers le reste du processus (autres lectures GDAL
+        ou rasterio, autres threads).
+        
+        Args:
+            num_threads: GDAL_NUM_THREADS (défaut: part des CPU d'un worker)
+        """
+        options = dict(self.GDAL_VSICURL_CONFIG,
+                       GDAL_NUM_THREADS=str(num_threads or self.gdal_threads))
+        with ExitStack() as stack:
+            if GDAL_AVAILABLE:
+                stack.enter_context(gdal.config_options(options))
+            stack.enter_context(rasterio.Env(**options))
+            yield
+    
+    def download_raster(self, tif_url, output_filepath, bbox=None, use_gdal=True, verbose=True):
         """
         Télécharge un raster WaPOR pour une zone géographique spécifique
         
@@ -114,226 +375,523 @@ class WaPORDownloader:
             output_filepath: Chemin de sortie
             bbox: Bounding box [left, top, right, bottom] ou None pour bbox du config
             use_gdal: Si True et GDAL disponible, découpe le raster
+            verbose: Si False, seules les erreurs sont affichées
+        
+        Messages écrits avec tqdm.write: appelé depuis les workers de
+        _download_worklist, sans casser la barre de progression.
         """
         if bbox is None:
             # Tunisia bbox: [lon_min, lat_min, lon_max, lat_max]
             bbox_config = self.bbox
             bbox = [bbox_config[0], bbox_config[3], bbox_config[2], bbox_config[1]]  # [left, top, right, bottom]
         
-        try:
-            # Méthode 1: GDAL (découpage COG - le plus efficace)
-            if use_gdal and GDAL_AVAILABLE:
-                translate_options = gdal.TranslateOptions(
-                    projWin=bbox,
-                    bandList=[1],
-                    unscale=True
-                )
-                
-                ds = gdal.Translate(output_filepath, f"/vsicurl/{tif_url}", options=translate_options)
-                
-                if ds is not None:
-                    print(f"  ✓ Téléchargé et découpé: {output_filepath}")
-                    ds = None
-                    return output_filepath
-                else:
-                    print(f"  ✗ Échec GDAL, tentative avec rasterio...")
-            
-            # Méthode 2: Rasterio (découpage COG - alternatif sans GDAL)
-            print(f"  📥 Téléchargement et découpage avec rasterio...")
-            
-            with rasterio.open(tif_url) as src:
-                # Convertir bbox en coordonnées pixel
-                window = from_bounds(bbox[0], bbox[3], bbox[2], bbox[1], src.transform)
+        # Écriture sous un nom temporaire du même dossier, renommé une fois le fichier
+        # complet: une erreur ou une interruption ne laisse pas de sortie partielle
+        partial_filepath = f"{output_filepath}.part"
+        
+        with self._gdal_env():
+            local_copy = None
+            try:
+                source = tif_url
+                gdal_source = f"/vsicurl/{tif_url}"
+                if not self._supports_ranges(tif_url):
+                    # Sans requêtes de plage, /vsicurl/ relirait le fichier morceau par morceau:
+                    # un seul GET en flux vers un fichier temporaire est plus rapide
+                    local_copy = self._stream_to_tempfile(tif_url, os.path.dirname(output_filepath))
+                    source = gdal_source = local_copy
                 
-                # Lire seulement la fenêtre qui nous intéresse
-                data = src.read(1, window=window)
+                # Méthode 1: GDAL (découpage COG - le plus efficace)
+                if use_gdal and GDAL_AVAILABLE:
+                    # Valeurs écrites en unités physiques (scale/offset appliqués, float32):
+                    # les notebooks et les statistiques zonales lisent les fichiers directement
+                    translate_options = gdal.TranslateOptions(
+                        format='GTiff',  # pilote explicite: le nom temporaire finit par .part
+                        projWin=bbox,
+                        bandList=[1],
+                        unscale=True,
+                        outputType=gdal.GDT_Float32,
+                        creationOptions=self.GTIFF_CREATION_OPTIONS + [f'NUM_THREADS={self.gdal_threads}']
+                    )
+                    
+                    ds = gdal.Translate(partial_filepath, gdal_source, options=translate_options)
+                    
+                    if ds is not None:
+                        ds = None  # Fermer (écrire) avant de renommer
+                        os.replace(partial_filepath, output_filepath)
+                        if verbose:
+                            tqdm.write(f"  ✓ Téléchargé et découpé: {output_filepath}")
+                        return output_filepath
+                    else:
+                        tqdm.write(f"  ✗ Échec GDAL, tentative avec rasterio...")
                 
-                # Calculer la nouvelle transformation
-                window_transform = src.window_transform(window)
+                # Méthode 2: Rasterio (découpage COG - alternatif sans GDAL)
+                if verbose:
+                    tqdm.write(f"  📥 Téléchargement et découpage avec rasterio...")
                 
-                # Sauvegarder le sous-ensemble
-                profile = src.profile.copy()
-                profile.update({
-                    'height': window.height,
-                    'width': window.width,
-                    'transform': window_transform
-                })
+                with rasterio.open(source) as src:
+                    # Fenêtre de la bbox et sa transformation (identiques pour toutes les années
+                    # d'un même mapset)
+                    window, window_transform = self._window_for(src, bbox)
+                    
+                    # Sauvegarder le sous-ensemble en unités physiques (float32, comme GDAL),
+                    # tuilé et compressé
+                    profile = src.profile.copy()
+                    profile.update({
+                        'driver': 'GTiff',
+                        'dtype': 'float32',
+                        'height': window.height,
+                        'width': window.width,
+                        'transform': window_transform,
+                        'num_threads': self.gdal_threads,
+                        'tiled': True,
+                        'blockxsize': 256,
+                        'blockysize': 256,
+                        'compress': 'deflate',
+                        'predictor': 3
+                    })
+                    
+                    # Lire seulement la fenêtre qui nous intéresse (seules les tuiles COG qui
+                    # l'intersectent sont demandées), bloc par bloc, lecture et écriture en parallèle
+                    with rasterio.open(partial_filepath, 'w', **profile) as dst:
+                        self._copy_window_pipelined(src, dst, window)
                 
-                with rasterio.open(output_filepath, 'w', **profile) as dst:
-                    dst.write(data, 1)
-            
-            print(f"  ✓ Téléchargé et découpé: {output_filepath}")
-            return output_filepath
+                os.replace(partial_filepath, output_filepath)
+                if verbose:
+                    tqdm.write(f"  ✓ Téléchargé et découpé: {output_filepath}")
+                return output_filepath
                 
-        except Exception as e:
-            print(f"  ✗ Erreur: {e}")
-            return None
+            except Exception as e:
+                tqdm.write(f"  ✗ Erreur: {e}")
+                return None
+            finally:
+                if local_copy is not None and os.path.exists(local_copy):
+                    os.remove(local_copy)
+                if os.path.exists(partial_filepath):
+                    os.remove(partial_filepath)
     
-    def download_annual_et(self, years=None, level=2):
+    def _window_for(self, src, bbox):
         """
-        Télécharge l'évapotranspiration annuelle (AETI) pour la Tunisie
+        Fenêtre pixel (entière) de la bbox dans src et transformation associée
+        
+        Mise en cache par grille source (crs, transform, dimensions) et bbox.
         
         Args:
-            years: Liste des années (par défaut: config)
-            level: Niveau WaPOR (1 ou 2, défaut=2 pour 100m résolution)
+            src: Dataset rasterio ouvert
+            bbox: [left, top, right, bottom]
+            
+        Returns:
+            (window, window_transform)
         """
-        if years is None:
-            years = self.years
+        key = (src.crs.to_wkt() if src.crs else None, tuple(src.transform),
+               src.width, src.height, tuple(bbox))
+        if key not in self._window_cache:
+            # Convertir bbox en coordonnées pixel (fenêtre entière, dans l'emprise)
+            window = from_bounds(bbox[0], bbox[3], bbox[2], bbox[1], src.transform)
+            window = window.round_offsets().round_lengths()
+            self._window_cache[key] = (window, src.window_transform(window))
+        return self._window_cache[key]
+    
+    def _copy_window_pipelined(self, src, dst, window, block_size=1024):
+        """
+        Copie une fenêtre de src vers dst par blocs: un thread lit pendant que
+        le thread principal écrit (mémoire bornée à quelques blocs)
         
-        print(f"\n📥 Téléchargement: Évapotranspiration annuelle (Level {level})")
+        Les valeurs sont converties en unités physiques (scale/offset de src, float32);
+        les pixels nodata gardent la valeur nodata.
         
-        # Mapset code pour ET annuel
-        mapset_code = f"L{level}-AETI-A"
+        Args:
+            src: Dataset source ouvert (lecture)
+            dst: Dataset de sortie ouvert (écriture), de la taille de la fenêtre
+            window: Fenêtre entière de src à copier
+            block_size: Côté des blocs, multiple des tuiles de sortie (256)
+        """
+        col_off, row_off = int(window.col_off), int(window.row_off)
+        out_windows = [
+            Window(col, row, min(block_size, dst.width - col), min(block_size, dst.height - row))
+            for row in range(0, dst.height, block_size)
+            for col in range(0, dst.width, block_size)
+        ]
+        blocks = queue.Queue(maxsize=4)
+        scale, offset = np.float32(src.scales[0]), np.float32(src.offsets[0])
         
-        # Créer le dossier de sortie
-        output_dir = f"{self.output_dir}/ET"
-        os.makedirs(output_dir, exist_ok=True)
+        def produce():
+            try:
+                # Options GDAL locales au thread: à réappliquer pour le lecteur
+                with self._gdal_env():
+                    for out_window in out_windows:
+                        src_window = Window(
+                            col_off + out_window.col_off, row_off + out_window.row_off,
+                            out_window.width, out_window.height
+                        )
+                        data = src.read(1, window=src_window, out_dtype=np.float32,
+                                        masked=False, boundless=False)
+                        valid = src.read_masks(1, window=src_window) != 0
+                        np.multiply(data, scale, out=data, where=valid)
+                        np.add(data, offset, out=data, where=valid)
+                        blocks.put((out_window, data))
+            finally:
+                blocks.put(None)  # Fin (ou erreur) de lecture
         
-        # Récupérer tous les rasters disponibles
-        all_rasters = self.get_rasters_for_mapset(mapset_code)
+        error = None
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            producer = executor.submit(produce)
+            while True:
+                item = blocks.get()
+                if item is None:
+                    break
+                # Après une erreur d'écriture, continuer à vider la file pour libérer le lecteur
+                if error is None:
+                    try:
+                        dst.write(item[1], 1, window=item[0])
+                    except Exception as e:
+                        error = e
+            producer.result()  # Propager une erreur de lecture
         
-        if not all_rasters:
-            print(f"  ✗ Aucun raster trouvé pour {mapset_code}")
-            return []
+        if error is not None:
+            raise error
+    
+    def _supports_ranges(self, url):
+        """
+        Vérifie (une fois par hôte) que le serveur accepte les requêtes de plage
         
-        downloaded_files = []
-        for year in years:
-            # Trouver le raster pour cette année
-            year_rasters = [r for r in all_rasters if str(year) in r[0]]
-            
-            if year_rasters:
-                code, url = year_rasters[0]
-                output_file = f"{output_dir}/AETI_L{level}_{year}.tif"
-                
-                if os.path.exists(output_file):
-                    print(f"  ⊙ {year}: existe déjà")
-                    downloaded_files.append(output_file)
+        Sonde: GET du premier octet (Range: bytes=0-0). Seule une réponse nette est
+        mise en cache: 206 (plages acceptées) ou 200/contenu gzip (plages ignorées).
+        En cas d'erreur de la sonde, /vsicurl/ est utilisé sans mise en cache: le
+        prochain fichier de l'hôte sondera à nouveau.
+        """
+        host = urlsplit(url).netloc
+        if host not in self._range_support:
+            probe_headers = {'Range': 'bytes=0-0', 'Accept-Encoding': 'identity'}
+            try:
+                if self.http is not None:
+                    with self.http.stream('GET', url, headers=probe_headers, timeout=10) as response:
+                        status, headers = response.status_code, response.headers
                 else:
-                    print(f"  📥 {year}: téléchargement en cours...")
-                    result = self.download_raster(url, output_file)
-                    if result:
-                        downloaded_files.append(result)
-            else:
-                print(f"  ✗ {year}: données non disponibles")
+                    with self.session.get(url, headers=probe_headers, stream=True, timeout=10) as response:
+                        status, headers = response.status_code, response.headers
+            except Exception:  # requests ou httpx: sonde indisponible
+                return True
+            
+            if status not in (200, 206):
+                return True  # Erreur du serveur: pas de réponse nette
+            self._range_support[host] = (
+                status == 206
+                and 'gzip' not in headers.get('Content-Encoding', '').lower()
+            )
+        return self._range_support[host]
+    
+    def _stream_to_tempfile(self, url, directory):
+        """
+        Télécharge un fichier entier en flux dans un fichier temporaire (.tif)
+        """
+        fd, tmp_path = tempfile.mkstemp(suffix='.tif', dir=directory or None)
+        try:
+            with os.fdopen(fd, 'wb') as f, self.session.get(url, stream=True, timeout=300) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                shutil.copyfileobj(response.raw, f, length=1024 * 1024)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+    
+    def _is_valid_local(self, path):
+        """
+        Vérifie qu'un fichier déjà présent est un raster complet et lisible
         
-        return downloaded_files
+        Un fichier vide ou tronqué (exécution interrompue) est considéré invalide
+        et sera téléchargé à nouveau.
+        """
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return False
+        try:
+            with rasterio.open(path) as ds:
+                # Dernier pixel: son bloc est écrit en dernier, absent si le fichier est tronqué
+                ds.read(1, window=Window(ds.width - 1, ds.height - 1, 1, 1))
+            return True
+        except Exception:
+            tqdm.write(f"  ⚠️  Fichier invalide, nouveau téléchargement: {path}")
+            return False
     
-    def download_transpiration(self, years=None, level=2):
+    def _fetch_year(self, year, url, output_file):
         """
-        Télécharge la transpiration annuelle (TBP) pour la Tunisie
+        Télécharge le raster d'une année (exécuté dans un thread worker)
+        """
+        return year, self.download_raster(url, output_file, verbose=False)
+    
+    def _download_worklist(self, work, desc=None):
+        """
+        Télécharge en parallèle une liste de (année, url, fichier de sortie)
+        
+        Returns:
+            dict {année: fichier téléchargé ou None}
+        """
+        results = {}
+        if not work:
+            return results
+        
+        max_workers = min(self.download_workers, len(work))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self._fetch_year, *item) for item in work]
+            # Une barre de progression pour le lot plutôt qu'une ligne par fichier
+            for future in tqdm(as_completed(futures), total=len(futures), desc=desc, unit='raster'):
+                year, result = future.result()
+                results[year] = result
+        
+        return results
+    
+    def _ensure_dir(self, path):
+        """
+        Crée un dossier de sortie une seule fois par processus
+        """
+        if path not in self._created_dirs:
+            os.makedirs(path, exist_ok=True)
+            self._created_dirs.add(path)
+    
+    def _rasters(self, mapset_code):
+        """
+        Liste (code, url) d'un mapset, mise en cache pour la durée de la session
         """
+        if mapset_code not in self._rasters_cache:
+            rasters = tuple(self.get_rasters_for_mapset(mapset_code))
+            if not rasters:
+                return rasters  # Ne pas mettre en cache un échec de l'API
+            self._rasters_cache[mapset_code] = rasters
+        return self._rasters_cache[mapset_code]
+    
+    def _download_variable(self, variable, years=None, level=None):
+        """
+        Télécharge une variable WaPOR annuelle (voir VARIABLES) pour la Tunisie
+        
+        Args:
+            variable: Clé de VARIABLES (ET, TBP, PCP, LCC)
+            years: Liste des années (par défaut: config)
+            level: Niveau WaPOR (par défaut: niveau de la variable)
+        """
+        mapset_name, period, default_level, prefix, label = self.VARIABLES[variable]
         if years is None:
             years = self.years
+        if level is None:
+            level = default_level
         
-        print(f"\n📥 Téléchargement: Transpiration annuelle (Level {level})")
+        print(f"\n📥 Téléchargement: {label} (Level {level})")
         
-        mapset_code = f"L{level}-T-A"
-        output_dir = f"{self.output_dir}/TBP"
-        os.makedirs(output_dir, exist_ok=True)
+        mapset_code = f"L{level}-{mapset_name}-{period}"
         
-        all_rasters = self.get_rasters_for_mapset(mapset_code)
+        # Créer le dossier de sortie
+        output_dir = f"{self.output_dir}/{variable}"
+        self._ensure_dir(output_dir)
+        
+        # Récupérer tous les rasters disponibles
+        all_rasters = self._rasters(mapset_code)
         
         if not all_rasters:
             print(f"  ✗ Aucun raster trouvé pour {mapset_code}")
             return []
         
-        downloaded_files = []
+        downloaded_files = {}
+        work = []
+        rasters_by_year = self._index_by_year(all_rasters)
+        # Fichiers présents: un seul parcours du dossier au lieu d'un stat par année
+        existing = {entry.name for entry in os.scandir(output_dir) if entry.is_file()}
         for year in years:
-            year_rasters = [r for r in all_rasters if str(year) in r[0]]
+            # Trouver le raster pour cette année
+            year_raster = rasters_by_year.get(year)
             
-            if year_rasters:
-                code, url = year_rasters[0]
-                output_file = f"{output_dir}/TBP_L{level}_{year}.tif"
+            if year_raster:
+                code, url = year_raster
+                filename = f"{prefix}_L{level}_{year}.tif"
+                output_file = f"{output_dir}/{filename}"
                 
-                if os.path.exists(output_file):
+                if filename in existing and self._is_valid_local(output_file):
                     print(f"  ⊙ {year}: existe déjà")
-                    downloaded_files.append(output_file)
+                    downloaded_files[year] = output_file
                 else:
-                    print(f"  📥 {year}: téléchargement en cours...")
-                    result = self.download_raster(url, output_file)
-                    if result:
-                        downloaded_files.append(result)
+                    work.append((year, url, output_file))
             else:
                 print(f"  ✗ {year}: données non disponibles")
         
-        return downloaded_files
+        # Téléchargements des années manquantes en parallèle (I/O réseau)
+        downloaded_files.update(self._download_worklist(work, desc=f"  {mapset_code}"))
+        return [downloaded_files[year] for year in years if downloaded_files.get(year)]
     
-    def download_precipitation(self, years=None, level=1):
+    def download_variable_stack(self, variable, years=None, level=None):
         """
-        Télécharge les précipitations annuelles (PCP) pour la Tunisie
+        Télécharge toutes les années d'une variable en un seul GeoTIFF multibande
+        
+        Un VRT (une bande par année) référence les COG distants; un unique
+        gdal.Translate découpe la bbox pour toutes les bandes à la fois.
+        
+        Args:
+            variable: Clé de VARIABLES (ET, TBP, PCP, LCC)
+            years: Liste des années (par défaut: config)
+            level: Niveau WaPOR (par défaut: niveau de la variable)
+            
+        Returns:
+            Chemin du fichier multibande (bandes nommées par année), ou None
         """
+        if not GDAL_AVAILABLE:
+            print("  ✗ GDAL requis pour l'empilement multibande")
+            return None
+        
+        mapset_name, period, default_level, prefix, label = self.VARIABLES[variable]
         if years is None:
             years = self.years
+        if level is None:
+            level = default_level
         
-        print(f"\n📥 Téléchargement: Précipitations annuelles (Level {level})")
+        mapset_code = f"L{level}-{mapset_name}-{period}"
+        rasters_by_year = self._index_by_year(self._rasters(mapset_code))
+        year_urls = [(year, rasters_by_year[year][1]) for year in years if year in rasters_by_year]
         
-        mapset_code = f"L{level}-PCP-A"
-        output_dir = f"{self.output_dir}/PCP"
-        os.makedirs(output_dir, exist_ok=True)
+        if not year_urls:
+            print(f"  ✗ Aucun raster trouvé pour {mapset_code}")
+            return None
         
-        all_rasters = self.get_rasters_for_mapset(mapset_code)
+        output_dir = f"{self.output_dir}/{variable}"
+        self._ensure_dir(output_dir)
+        output_file = f"{output_dir}/{prefix}_L{level}_{year_urls[0][0]}-{year_urls[-1][0]}.tif"
         
-        if not all_rasters:
-            print(f"  ✗ Aucun raster trouvé pour {mapset_code}")
-            return []
+        print(f"\n📥 Téléchargement: {label} (Level {level}, {len(year_urls)} bandes)")
         
-        downloaded_files = []
-        for year in years:
-            year_rasters = [r for r in all_rasters if str(year) in r[0]]
-            
-            if year_rasters:
-                code, url = year_rasters[0]
-                output_file = f"{output_dir}/PCP_L{level}_{year}.tif"
+        bbox = [self.bbox[0], self.bbox[3], self.bbox[2], self.bbox[1]]  # [left, top, right, bottom]
+        partial_file = f"{output_file}.part"
+        with self._gdal_env('ALL_CPUS'):
+            vrt_path = f"/vsimem/{variable}_L{level}_stack.vrt"
+            try:
+                vrt = gdal.BuildVRT(
+                    vrt_path,
+                    [f"/vsicurl/{url}" for _, url in year_urls],
+                    options=gdal.BuildVRTOptions(separate=True)
+                )
+                ds = gdal.Translate(
+                    partial_file,
+                    vrt,
+                    options=gdal.TranslateOptions(
+                        format='GTiff',  # pilote explicite: le nom temporaire finit par .part
+                        projWin=bbox,
+                        unscale=True,
+                        outputType=gdal.GDT_Float32,
+                        creationOptions=self.GTIFF_CREATION_OPTIONS + ['NUM_THREADS=ALL_CPUS', 'BIGTIFF=IF_SAFER']
+                    )
+                )
+                vrt = None
                 
-                if os.path.exists(output_file):
-                    print(f"  ⊙ {year}: existe déjà")
-                    downloaded_files.append(output_file)
-                else:
-                    print(f"  📥 {year}: téléchargement en cours...")
-                    result = self.download_raster(url, output_file)
-                    if result:
-                        downloaded_files.append(result)
-            else:
-                print(f"  ✗ {year}: données non disponibles")
+                if ds is None:
+                    print(f"  ✗ Échec GDAL: {output_file}")
+                    return None
+                
+                for band_index, (year, _) in enumerate(year_urls, start=1):
+                    ds.GetRasterBand(band_index).SetDescription(str(year))
+                ds = None
+                os.replace(partial_file, output_file)
+            finally:
+                gdal.Unlink(vrt_path)
+                if os.path.exists(partial_file):
+                    os.remove(partial_file)
         
-        return downloaded_files
+        print(f"  ✓ Téléchargé et découpé: {output_file}")
+        return output_file
     
-    def download_land_cover(self, years=None, level=1):
+    def export_to_zarr(self, variable, years=None, level=None, store_path=None):
         """
-        Télécharge la couverture du sol (LCC - Land Cover Classification) pour la Tunisie
+        Regroupe les GeoTIFF annuels d'une variable dans un store Zarr (time, y, x)
+        
+        Une année = un bloc temporel (chunks 1×256×256, Blosc/zstd): les lectures de
+        séries temporelles ne rouvrent plus un fichier par année. Le géoréférencement
+        (transform, CRS, nodata, scale/offset) et les années sont stockés en attributs.
+        
+        Args:
+            variable: Clé de VARIABLES (ET, TBP, PCP, LCC)
+            years: Années de l'axe temporel (par défaut: config)
+            level: Niveau WaPOR (par défaut: niveau de la variable)
+            store_path: Chemin du store (défaut: data/raw/wapor.zarr)
+            
+        Returns:
+            Chemin du store, ou None
         """
+        if not ZARR_AVAILABLE:
+            print("  ✗ zarr requis pour l'export Zarr")
+            return None
+        
+        _, _, default_level, prefix, _ = self.VARIABLES[variable]
         if years is None:
             years = self.years
+        if level is None:
+            level = default_level
+        if store_path is None:
+            store_path = f"{self.output_dir}/wapor.zarr"
         
-        print(f"\n📥 Téléchargement: Couverture du sol (Level {level})")
+        files = {
+            year: f"{self.output_dir}/{variable}/{prefix}_L{level}_{year}.tif"
+            for year in years
+        }
+        files = {year: path for year, path in files.items() if os.path.exists(path)}
+        if not files:
+            print(f"  ✗ Aucun fichier {variable} (Level {level}) à exporter")
+            return None
         
-        mapset_code = f"L{level}-LCC-A"
-        output_dir = f"{self.output_dir}/LCC"
-        os.makedirs(output_dir, exist_ok=True)
+        with rasterio.open(next(iter(files.values()))) as ref:
+            height, width, dtype = ref.height, ref.width, ref.dtypes[0]
+            attrs = {
+                'years': list(years),
+                'transform': list(ref.transform)[:6],
+                'crs': ref.crs.to_wkt() if ref.crs else None,
+                'nodata': ref.nodata,
+                'scale': ref.scales[0],
+                'offset': ref.offsets[0]
+            }
         
-        all_rasters = self.get_rasters_for_mapset(mapset_code)
+        # Tableau recréé à chaque export: les années, la grille ou le type peuvent changer
+        group = zarr.open_group(store_path, mode='a').require_group(variable)
+        array = group.create_dataset(
+            str(level),
+            shape=(len(years), height, width),
+            chunks=(1, 256, 256),
+            dtype=dtype,
+            fill_value=attrs['nodata'],
+            overwrite=True,
+            compressor=numcodecs.Blosc(cname='zstd', clevel=3, shuffle=numcodecs.Blosc.BITSHUFFLE)
+        )
+        array.attrs.update(attrs)
         
-        if not all_rasters:
-            print(f"  ✗ Aucun raster trouvé pour {mapset_code}")
-            return []
+        # Écriture année par année: chaque année ne touche que ses propres blocs
+        for time_index, year in enumerate(years):
+            if year not in files:
+                continue
+            with rasterio.open(files[year]) as src:
+                if src.shape != (height, width):
+                    print(f"  ✗ {year}: grille différente, ignorée")
+                    continue
+                array[time_index] = src.read(1)
         
-        downloaded_files = []
-        for year in years:
-            year_rasters = [r for r in all_rasters if str(year) in r[0]]
-            
-            if year_rasters:
-                code, url = year_rasters[0]
-                output_file = f"{output_dir}/LCC_L{level}_{year}.tif"
-                
-                if os.path.exists(output_file):
-                    print(f"  ⊙ {year}: existe déjà")
-                    downloaded_files.append(output_file)
-                else:
-                    print(f"  📥 {year}: téléchargement en cours...")
-                    result = self.download_raster(url, output_file)
-                    if result:
-                        downloaded_files.append(result)
-            else:
-                print(f"  ✗ {year}: données non disponibles")
+        print(f"  ✓ Export Zarr: {store_path}/{variable}/{level} ({len(files)} années)")
+        return store_path
+    
+    def download_annual_et(self, years=None, level=2):
+        """
+        Télécharge l'évapotranspiration annuelle (AETI) pour la Tunisie
         
-        return downloaded_files
\ No newline at end of file
+        Args:
+            years: Liste des années (par défaut: config)
+            level: Niveau WaPOR (1 ou 2, défaut=2 pour 100m résolution)
+        """
+        return self._download_variable('ET', years, level)
+    
+    def download_transpiration(self, years=None, level=2):
+        """
+        Télécharge la transpiration annuelle (TBP) pour la Tunisie
+        """
+        return self._download_variable('TBP', years, level)
+    
+    def download_precipitation(self, years=None, level=1):
+        """
+        Télécharge les précipitations annuelles (PCP) pour la Tunisie
+        """
+        return self._download_variable('PCP', years, level)
+    
+    def download_land_cover(self, years=None, level=1):
+        """
+        Télécharge la couverture du sol (LCC - Land Cover Classification) pour la Tunisie
+        """
+        return self._download_variable('LCC', years, level)